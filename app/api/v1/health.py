@@ -0,0 +1,27 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+
+from app import depends
+from app.api.v1.user.dependencies import get_current_staff_user
+from app.core.admission import AdmissionController
+from app.core.passwords import password_hasher
+from app.depends import get_services
+from app.models.api.health import LoadResponse
+
+
+# load of the worker is reported to staff users only
+health_router = APIRouter(dependencies=[Depends(get_current_staff_user)])
+
+
+@health_router.get("/load", response_model=LoadResponse, status_code=HTTPStatus.OK)
+async def load(
+        admission_controller: AdmissionController = Depends(get_services('admission_controller')),
+) -> LoadResponse:
+    """In flight and queued work of cpu heavy routes near cache hit rate and memory storage usage of this worker."""
+    return LoadResponse(
+        admission=admission_controller.stats(),
+        password_hasher=password_hasher.stats(),
+        near_cache=depends.storage.near_cache_stats(),
+        storage=depends.storage.stats(),
+    )
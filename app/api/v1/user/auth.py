@@ -2,23 +2,25 @@ import logging
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from app.api.v1.user.dependencies import get_current_active_user, get_credentials_payload, get_refresh_token_payload, \
-    get_current_active_user_from_refresh_token
+    get_current_active_user_from_refresh_token, get_claims_user, rate_limit, admission_control
 from app.core.config import settings
 from app.core.errors import ServiceError
+from app.core.fastapi.auth.jwt.keyring import key_ring
+from app.core.fastapi.auth.models import CustomUser
 from app.core.fastapi.constants import USER_EXISTS_EXCEPTION, USER_DOES_NOT_EXISTS_EXCEPTION
 from app.depends import get_services
-from app.models.api.auth import TokenResponse
+from app.models.api.auth import TokenResponse, JWKSResponse
 from app.models.api.base import SuccessResponse
-from app.models.api.user import EmailRegistration, UserSignup, UserSignin
+from app.models.api.user import EmailRegistration, UserSignup, UserSignin, UserIdentity
 from app.models.db.user import User
 from app.services.user import UserService
 from app.services.verification_code import VerificationCodeService
 
 
-user_auth_router = APIRouter()
+user_auth_router = APIRouter(dependencies=[Depends(rate_limit)])
 logger = logging.getLogger(__name__)
 
 
@@ -41,27 +43,32 @@ async def register_email(
     return SuccessResponse()
 
 
-@user_auth_router.post("/signup", response_model=TokenResponse, status_code=HTTPStatus.OK)
+@user_auth_router.post("/signup", response_model=TokenResponse, status_code=HTTPStatus.OK,
+                       dependencies=[Depends(admission_control)])
 async def signup(
         user_data: UserSignup,
         verification_code_service: VerificationCodeService = Depends(get_services('verification_code_service')),
         user_service: UserService = Depends(get_services('user_service')),
 ) -> TokenResponse:
-    user = await user_service.get_user_by_login(email=user_data.email)
-    if user:
-        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
-                            detail=USER_EXISTS_EXCEPTION.format(email=user_data.email))
     try:
         await verification_code_service.validate_verification_code(email=user_data.email, code=user_data.code)
     except ServiceError as exc:
         raise HTTPException(status_code=exc.status_code,
                             detail=str(exc))
 
-    token_response = await user_service.signup(user_data=user_data)
+    try:
+        token_response = await user_service.signup(
+            user_data=user_data,
+            verification_code_service=verification_code_service,
+        )
+    except ServiceError as exc:
+        raise HTTPException(status_code=exc.status_code,
+                            detail=str(exc))
     return token_response
 
 
-@user_auth_router.post("/signin", response_model=TokenResponse, status_code=HTTPStatus.OK)
+@user_auth_router.post("/signin", response_model=TokenResponse, status_code=HTTPStatus.OK,
+                       dependencies=[Depends(admission_control)])
 async def signin(
         user_data: UserSignin,
         user_service: UserService = Depends(get_services('user_service')),
@@ -89,6 +96,16 @@ async def logout(
     return SuccessResponse()
 
 
+@user_auth_router.post("/logout/all", response_model=SuccessResponse, status_code=HTTPStatus.OK)
+async def logout_all(
+        user: Annotated[User, Depends(get_current_active_user)],
+        user_service: UserService = Depends(get_services('user_service')),
+) -> SuccessResponse:
+    """Logout user from all devices. Revokes all user access and refresh tokens."""
+    await user_service.revoke_user_tokens(user_id=user.id)
+    return SuccessResponse()
+
+
 @user_auth_router.post("/refresh", response_model=TokenResponse, status_code=HTTPStatus.OK)
 async def refresh(
         user: Annotated[User, Depends(get_current_active_user_from_refresh_token)],
@@ -97,3 +114,25 @@ async def refresh(
 ) -> TokenResponse:
     token_response = await user_service.refresh_token_pair(user=user, access_token_id=refresh_token_payload['jti'])
     return token_response
+
+
+@user_auth_router.get("/jwks", response_model=JWKSResponse, status_code=HTTPStatus.OK)
+async def jwks(request: Request, response: Response) -> JWKSResponse | Response:
+    """Public keys to verify issued tokens locally."""
+    key_set = key_ring.jwks()
+    kids = '.'.join(key['kid'] for key in key_set['keys'])
+    etag = f'"{kids}"'
+    headers = {
+        'Cache-Control': f'public, max-age={settings.JWT_JWKS_MAX_AGE}',
+        'ETag': etag,
+    }
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return JWKSResponse(**key_set)
+
+
+@user_auth_router.get("/me", response_model=UserIdentity, status_code=HTTPStatus.OK)
+async def me(user: Annotated[CustomUser, Depends(get_claims_user)]) -> UserIdentity:
+    """Identity of authenticated user from access token claims."""
+    return UserIdentity(id=user.id, email=user.email)
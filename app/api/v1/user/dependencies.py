@@ -1,19 +1,35 @@
+import math
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Optional
 
 import jwt
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.core.fastapi.auth.jwt.jwt import jwt_decode_handler
+from app.core.admission import AdmissionController
+from app.core.config import settings
+from app.core.errors import ServiceError
+from app.core.fastapi.auth.jwt.jwt import get_token_issued_at_ms, jwt_decode_handler
+from app.core.fastapi.auth.models import CustomUser
+from app.core.rate_limit import RateLimit, TokenBucketLimiter
 from app.depends import get_services
 from app.models.api.user import RefreshToken
 from app.models.db import User
 from app.services.user import UserService
+from app.services.user_cache import CachedUser
 
 
 oauth2_scheme = HTTPBearer()
 
+# route name -> bucket kind -> limit, empty setting disables the bucket
+RATE_LIMITS: dict[str, dict[str, RateLimit]] = {
+    route_name: {kind: RateLimit.parse(limit) for kind, limit in limits.items() if limit}
+    for route_name, limits in {
+        'signin': {'ip': settings.RATE_LIMIT_SIGNIN_PER_IP, 'email': settings.RATE_LIMIT_SIGNIN_PER_EMAIL},
+        'register_email': {'ip': settings.RATE_LIMIT_EMAIL_PER_IP, 'email': settings.RATE_LIMIT_EMAIL_PER_EMAIL},
+    }.items()
+}
+
 
 def get_token_payload(token: str) -> dict:
     try:
@@ -22,7 +38,7 @@ def get_token_payload(token: str) -> dict:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail=str(exc),
-            headers={'Authenticate': 'Bearer'},
+            headers={'WWW-Authenticate': 'Bearer'},
         )
 
 
@@ -34,16 +50,16 @@ async def get_refresh_token_payload(refresh_token: RefreshToken) -> dict:
     return get_token_payload(token=refresh_token.refresh_token)
 
 
-async def get_user_from_payload(payload: dict, user_service: UserService) -> User:
+async def get_user_from_payload(payload: dict, user_service: UserService) -> User | CachedUser:
     credentials_exception = HTTPException(
         status_code=HTTPStatus.UNAUTHORIZED,
         detail='Could not validate credentials',
-        headers={'Authenticate': 'Bearer'},
+        headers={'WWW-Authenticate': 'Bearer'},
     )
     email: str = payload.get('email')
     if email is None:
         raise credentials_exception
-    user = await user_service.get_user_by_login(email=email)
+    user = await user_service.get_cached_user_by_login(email=email)
     if user is None:
         raise credentials_exception
     return user
@@ -52,8 +68,9 @@ async def get_user_from_payload(payload: dict, user_service: UserService) -> Use
 async def get_current_user_from_credentials(
         payload: dict = Depends(get_credentials_payload),
         user_service: UserService = Depends(get_services('user_service')),
-) -> User:
+) -> User | CachedUser:
     user = await get_user_from_payload(payload=payload, user_service=user_service)
+    await user_service.check_token_is_not_revoked(user_id=user.id, issued_at_ms=get_token_issued_at_ms(payload))
     await user_service.check_access_token_blacklisted(access_token_id=payload['jti'])
     return user
 
@@ -61,23 +78,105 @@ async def get_current_user_from_credentials(
 async def get_current_user_from_refresh_token(
         payload: dict = Depends(get_refresh_token_payload),
         user_service: UserService = Depends(get_services('user_service')),
-) -> User:
+) -> User | CachedUser:
+    # refresh token activity is checked while it is rotated, see UserService.refresh_token_pair
     user = await get_user_from_payload(payload=payload, user_service=user_service)
-    await user_service.check_refresh_token_is_active(user_id=user.id, access_token_id=payload['jti'])
+    await user_service.check_token_is_not_revoked(user_id=user.id, issued_at_ms=get_token_issued_at_ms(payload))
     return user
 
 
 async def get_current_active_user(
-    current_user: Annotated[User, Depends(get_current_user_from_credentials)]
-) -> User:
+    current_user: Annotated[User | CachedUser, Depends(get_current_user_from_credentials)]
+) -> User | CachedUser:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail='Inactive user')
     return current_user
 
 
+async def get_current_staff_user(
+    current_user: Annotated[User | CachedUser, Depends(get_current_active_user)]
+) -> User | CachedUser:
+    if not current_user.is_staff and not current_user.is_superuser:
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions')
+    return current_user
+
+
 async def get_current_active_user_from_refresh_token(
-    current_user: Annotated[User, Depends(get_current_user_from_refresh_token)]
-) -> User:
+    current_user: Annotated[User | CachedUser, Depends(get_current_user_from_refresh_token)]
+) -> User | CachedUser:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail='Inactive user')
     return current_user
+
+
+async def get_claims_user(
+        request: Request,
+        user_service: UserService = Depends(get_services('user_service')),
+) -> CustomUser:
+    """Authenticated user built by AuthMiddleware from access token claims.
+
+    Does not query database or cache. Access token blacklist is checked through
+    the local blacklist filter, storage is queried only on a filter hit. Revocation
+    epoch of the user is kept in process for REVOCATION_EPOCH_CACHE_TTL seconds.
+    Use ``get_current_active_user`` for routes which need the full user record.
+    """
+    if not request.user.is_authenticated:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=request.scope.get('auth_error') or 'Not authenticated',
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+    await user_service.check_token_is_not_revoked(user_id=request.user.id, issued_at_ms=request.user.issued_at_ms)
+    await user_service.check_access_token_blacklisted(access_token_id=request.user.token_id)
+    return request.user
+
+
+async def get_request_email(request: Request) -> Optional[str]:
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get('email') if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+async def rate_limit(
+        request: Request,
+        rate_limiter: TokenBucketLimiter = Depends(get_services('rate_limiter')),
+) -> None:
+    """Limits requests to routes listed in RATE_LIMITS by client ip and requested email."""
+    route_name = getattr(request.scope.get('route'), 'name', None)
+    limits = RATE_LIMITS.get(route_name)
+    if not settings.RATE_LIMIT_ENABLED or not limits:
+        return None
+
+    buckets = []
+    if 'ip' in limits and request.client is not None:
+        buckets.append((f'{route_name}-ip-{request.client.host}', limits['ip']))
+    if 'email' in limits:
+        email = await get_request_email(request)
+        if email:
+            buckets.append((f'{route_name}-email-{email}', limits['email']))
+
+    retry_after = await rate_limiter.take(buckets)
+    if retry_after:
+        raise HTTPException(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            detail='Too many requests, try again later',
+            headers={'Retry-After': str(math.ceil(retry_after))},
+        )
+    return None
+
+
+async def admission_control(
+        admission_controller: AdmissionController = Depends(get_services('admission_controller')),
+) -> AsyncIterator[None]:
+    """Limits concurrency of cpu heavy routes, rejects requests which cannot start in time."""
+    try:
+        await admission_controller.acquire()
+    except ServiceError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc), headers={'Retry-After': '1'})
+    try:
+        yield
+    finally:
+        admission_controller.release()
@@ -1,43 +1,62 @@
-from typing import List, Tuple
+import asyncio
+from typing import List, Optional, Tuple
 
 from redis.asyncio import Redis
 from fastapi_cache.backends.redis import RedisBackend as BaseRedisBackend
 
+from app.core.hash_ring import HashRing
+
 
 class RedisBackend(BaseRedisBackend):
-    def __init__(self, redis_pools: List[Redis]):
-        self.__redis_pools = redis_pools
+    """Cache backend sharding keys over redis pools by consistent hash ring.
 
-    def get_redis_pool_by_key(self, key: str):
-        """Returns redis pool by key"""
-        pool_index = hash(key) % len(self.__redis_pools)
+    Pool of a key is resolved on every call instead of being kept on the
+    backend, so concurrent requests never use each other's pool. Pools are
+    named by their address, which keeps routing stable across processes and
+    restarts, and adding a pool moves only about 1/N of keys.
+    """
+
+    def __init__(self, redis_pools: List[Redis], vnodes: int = 160):
+        self.__redis_pools = {self.get_pool_name(redis_pool): redis_pool for redis_pool in redis_pools}
+        self.__ring = HashRing(self.__redis_pools, vnodes=vnodes)
+        self.is_cluster = False
 
-        return self.__redis_pools[pool_index]
+    @staticmethod
+    def get_pool_name(redis_pool: Redis) -> str:
+        kwargs = redis_pool.connection_pool.connection_kwargs
+        return f'{kwargs.get("host", "localhost")}:{kwargs.get("port", 6379)}/{kwargs.get("db", 0)}'
+
+    def get_redis_pool_by_key(self, key: str) -> Redis:
+        """Returns redis pool by key"""
+        return self.__redis_pools[self.__ring.get_node(key)]
 
     async def close_redis_pools(self):
         """
         Safely closes all redis pools
         """
-        for redis_pool in self.__redis_pools:
-            redis_pool.close()
-            await redis_pool.wait_closed()
-
-    @property
-    def redis(self) -> Redis:
-        return self.get_redis_pool_by_key(self.key)
-
-    async def get(self, key) -> str:
-        self.key = key
-        return await super().get(key)
-
-    async def get_with_ttl(self, key: str) -> Tuple[int, str]:
-        self.key = key
-        return await super().get_with_ttl(key)
-
-    async def set(self, key: str, value: str, expire: int):
-        self.key = key
-        return await super().set(key, value, expire=expire)
-
-    async def clear(self, namespace: str, key: str) -> int:
-        self.key = key
-        return await super().clear(namespace=namespace, key=key)
+        await asyncio.gather(*(redis_pool.close() for redis_pool in self.__redis_pools.values()))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.get_redis_pool_by_key(key).get(key)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        async with self.get_redis_pool_by_key(key).pipeline(transaction=True) as pipe:
+            return await pipe.ttl(key).get(key).execute()
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.get_redis_pool_by_key(key).set(key, value, ex=expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            # keys of namespace are spread over all pools
+            return sum(await asyncio.gather(*(
+                self._clear_namespace(redis_pool, namespace) for redis_pool in self.__redis_pools.values()
+            )))
+        elif key:
+            return await self.get_redis_pool_by_key(key).delete(key)
+        return 0
+
+    @staticmethod
+    async def _clear_namespace(redis_pool: Redis, namespace: str) -> int:
+        keys = [key async for key in redis_pool.scan_iter(match=f'{namespace}:*', count=500)]
+        return await redis_pool.delete(*keys) if keys else 0
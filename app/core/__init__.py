@@ -1,2 +0,0 @@
-from app.core.celery import celery_app
-import app.core.tasks.user
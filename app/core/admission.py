@@ -0,0 +1,105 @@
+__all__ = (
+    'AdmissionController',
+)
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.errors import AdmissionError
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded FIFO wait queue and a queue time deadline.
+
+    At most ``limit`` requests run at once. Up to ``queue_size`` more wait for a
+    slot, each no longer than ``queue_timeout`` seconds. Requests which would
+    exceed the queue or the deadline are rejected at once, so overload turns
+    into fast errors instead of growing latency for every request.
+    """
+
+    def __init__(
+            self,
+            limit: Optional[int] = None,
+            queue_size: Optional[int] = None,
+            queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.limit = limit or settings.ADMISSION_CONCURRENCY or settings.PASSWORD_HASHER_POOL_SIZE * 2
+        self.queue_size = settings.ADMISSION_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = queue_timeout or settings.ADMISSION_QUEUE_TIMEOUT
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, message: str) -> AdmissionError:
+        return AdmissionError(message, status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise self._reject('Server is overloaded, try again later!')
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done() or waiter.cancelled():
+                self.timed_out += 1
+                raise self._reject('Server is overloaded, request was not started in time!')
+            # otherwise slot was handed over right at the deadline
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return None
+
+    def release(self) -> None:
+        """Hands slot over to the oldest waiting request or frees it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return None
+        self.in_flight -= 1
+        return None
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'queue_size': self.queue_size,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
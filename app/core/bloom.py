@@ -0,0 +1,49 @@
+__all__ = (
+    'BloomFilter',
+)
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Fixed size Bloom filter of strings.
+
+    Size and number of hashes are derived from expected ``capacity`` and
+    desired false positive ``error_rate``. Positions are computed with double
+    hashing over a single blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def memory(self) -> int:
+        """Bits array size in bytes."""
+        return len(self._bits)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """False positive rate for current number of added values."""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
@@ -5,3 +5,18 @@ from app.core.config import settings
 celery_app = Celery('fastapi_auth_test')
 celery_app.conf.broker_url = settings.CELERY_BROKER_URL
 celery_app.conf.result_backend = settings.CELERY_RESULT_BACKEND
+celery_app.conf.imports = ('app.core.tasks.user', 'app.core.tasks.outbox')
+celery_app.conf.beat_schedule = {
+    'sweep_refresh_tokens': {
+        'task': 'sweep_refresh_tokens',
+        'schedule': settings.REFRESH_TOKENS_SWEEP_INTERVAL,
+    },
+    'purge_verification_codes': {
+        'task': 'purge_verification_codes',
+        'schedule': settings.VERIFICATION_CODES_PURGE_INTERVAL,
+    },
+    'relay_outbox': {
+        'task': 'relay_outbox',
+        'schedule': settings.OUTBOX_RELAY_INTERVAL,
+    },
+}
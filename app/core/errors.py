@@ -26,3 +26,11 @@ class VerificationCodeServiceError(ServiceError):
 
 class UserServiceError(ServiceError):
     pass
+
+
+class PasswordHasherError(ServiceError):
+    pass
+
+
+class AdmissionError(ServiceError):
+    pass
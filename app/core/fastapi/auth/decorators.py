@@ -9,10 +9,10 @@ from starlette.requests import Request
 def is_auth_user(request: Request) -> bool:
     try:
         user = getattr(request, 'user')  # noqa
-        is_auth = getattr(user, 'is_verified')  # noqa
+        is_auth = getattr(user, 'is_authenticated')  # noqa
         return is_auth  # noqa
 
-    except AttributeError:
+    except (AttributeError, AssertionError):
         return False
 
 
@@ -0,0 +1,69 @@
+__all__ = (
+    'VerifiedTokenCache',
+    'token_cache',
+)
+
+import hashlib
+import time
+from typing import Optional
+
+import jwt
+
+from app.cache.memory import TTLCache
+from app.core.config import settings
+
+
+class VerifiedTokenCache(TTLCache):
+    """Bounded LRU cache of already verified token payloads.
+
+    Entries are keyed by a sha256 digest of the raw token and live until the
+    token's own ``exp`` or ``ttl`` seconds, whichever comes first. Claims that
+    depend on the current time or on settings are re-checked on every hit.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None) -> None:
+        super().__init__(
+            max_size=settings.JWT_DECODE_CACHE_SIZE if max_size is None else max_size,
+            ttl=settings.JWT_DECODE_CACHE_TTL if ttl is None else ttl,
+        )
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Returns cached payload for token or None, counting a hit or a miss."""
+        payload = super().get(self._digest(token))
+        if payload is None:
+            return None
+        self.validate_claims(payload)
+        return dict(payload)
+
+    def set(self, token: str, payload: dict) -> None:
+        """Stores verified payload for token."""
+        ttl = self.ttl
+        if 'exp' in payload:
+            ttl = min(ttl, int(payload['exp']) + settings.JWT_LEEWAY - time.time())
+        if ttl > 0:
+            super().set(self._digest(token), dict(payload), ttl=ttl)
+        return None
+
+    @staticmethod
+    def validate_claims(payload: dict) -> None:
+        """Enforces expiration, audience and issuer of a cached payload."""
+        if settings.JWT_VERIFY_EXPIRATION and 'exp' in payload:
+            if int(payload['exp']) <= time.time() - settings.JWT_LEEWAY:
+                raise jwt.ExpiredSignatureError('Signature has expired')
+
+        if settings.JWT_AUDIENCE is not None:
+            audience = payload.get('aud')
+            if isinstance(audience, str):
+                audience = [audience]
+            if not audience or settings.JWT_AUDIENCE not in audience:
+                raise jwt.InvalidAudienceError('Audience doesn\'t match')
+
+        if settings.JWT_ISSUER is not None and payload.get('iss') != settings.JWT_ISSUER:
+            raise jwt.InvalidIssuerError('Invalid issuer')
+
+
+token_cache = VerifiedTokenCache()
@@ -1,15 +1,36 @@
+import time
 import uuid
-from datetime import datetime
-from typing import Optional, Union
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
 import jwt
+import orjson
+from jwt.utils import base64url_encode
 
 from app.core.config import settings
 from app.core.enums.jwt import JwtTokenTypeEnum
+from app.core.fastapi.auth.jwt.cache import token_cache
+from app.core.fastapi.auth.jwt.keyring import key_ring, KeyRing, SigningKey
 
 ACCESS_TOKEN_SUB = 'access'
 
 
 def jwt_decode_handler(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = _jwt_decode(token)
+    token_cache.set(token, payload)
+    return payload
+
+
+def _jwt_decode(token: str) -> dict:
+    kid = jwt.get_unverified_header(token).get('kid')
+    key = key_ring.get(kid)
+    if key is None:
+        raise jwt.InvalidKeyError(f'Unknown signing key {kid}')
+
     options = {
         'verify_exp': settings.JWT_VERIFY_EXPIRATION,
         'require_iat': True,
@@ -17,13 +38,13 @@ def jwt_decode_handler(token: str) -> dict:
     }
     return jwt.decode(
         token,
-        settings.jwt_public_key,
+        key.public_key,
         verify=settings.JWT_VERIFY,
         options=options,
         leeway=settings.JWT_LEEWAY,
         audience=settings.JWT_AUDIENCE,
         issuer=settings.JWT_ISSUER,
-        algorithms=[settings.JWT_ALGORITHM]
+        algorithms=[key.algorithm]
     )
 
 
@@ -37,7 +58,18 @@ def get_jti(encoded_token: str) -> str:
 
 
 def _jwt_get_iat() -> int:
-    return int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds())
+    return int(time.time())
+
+
+def _jwt_get_iat_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def get_token_issued_at_ms(payload: dict) -> int:
+    """Returns issue time of token in milliseconds, tokens without ``iat_ms`` claim are
+    taken as issued at the start of their ``iat`` second.
+    """
+    return payload.get('iat_ms', payload['iat'] * 1000)
 
 
 def _jwt_get_exp(iat: int, token_type: JwtTokenTypeEnum) -> int:
@@ -51,27 +83,32 @@ def _get_jwt_identifier() -> str:
     return str(uuid.uuid4())
 
 
-def jwt_payload_handler(
+def _jwt_static_claims() -> dict[str, str]:
+    """Claims which are the same for every issued token."""
+    claims = {'iss': settings.JWT_ISSUER}
+    if settings.JWT_AUDIENCE is not None:
+        claims['aud'] = settings.JWT_AUDIENCE
+    return claims
+
+
+def _jwt_dynamic_claims(
         user_id: int,
         token_type: JwtTokenTypeEnum,
-        iat: Optional[int] = None,
+        iat: int,
         sub: Optional[str] = None,
         email: Optional[str] = None,
-        device_id: Optional[str] = None
-):
-
-    if iat is None:
-        iat = _jwt_get_iat()
-
-    exp = _jwt_get_exp(iat, token_type)
-
+        device_id: Optional[str] = None,
+        orig_iat: Optional[int] = None,
+        iat_ms: Optional[int] = None,
+) -> dict[str, Union[str, int]]:
     payload: dict[str, Union[str, int]] = {
         'user_id': user_id,
         'iat': iat,
-        'exp': exp,
+        # iat has whole seconds, revocations are compared with the millisecond one
+        'iat_ms': iat_ms if iat_ms is not None else iat * 1000,
+        'exp': _jwt_get_exp(iat, token_type),
         'type': token_type.value,
         'jti': _get_jwt_identifier(),
-        'iss': settings.JWT_ISSUER,
     }
     if email:
         payload['email'] = email
@@ -82,10 +119,7 @@ def jwt_payload_handler(
     # Include original issued at time for a brand-new token,
     # to allow token refresh
     if settings.JWT_ALLOW_REFRESH:
-        payload['orig_iat'] = _jwt_get_iat()
-
-    if settings.JWT_AUDIENCE is not None:
-        payload['aud'] = settings.JWT_AUDIENCE
+        payload['orig_iat'] = orig_iat if orig_iat is not None else _jwt_get_iat()
 
     if sub is not None:
         payload['sub'] = sub
@@ -93,12 +127,121 @@ def jwt_payload_handler(
     return payload
 
 
+def jwt_payload_handler(
+        user_id: int,
+        token_type: JwtTokenTypeEnum,
+        iat: Optional[int] = None,
+        sub: Optional[str] = None,
+        email: Optional[str] = None,
+        device_id: Optional[str] = None
+):
+
+    iat_ms = None
+    if iat is None:
+        iat_ms = _jwt_get_iat_ms()
+        iat = iat_ms // 1000
+
+    payload = _jwt_dynamic_claims(
+        user_id=user_id,
+        token_type=token_type,
+        iat=iat,
+        sub=sub,
+        email=email,
+        device_id=device_id,
+        iat_ms=iat_ms,
+    )
+    payload.update(_jwt_static_claims())
+    return payload
+
+
+@dataclass(frozen=True)
+class MintedToken:
+    token: str
+    payload: dict
+
+
+class TokenMinter:
+    """Signs tokens with the key ring active key and pre-serialized static claims.
+
+    The header segment (per ``kid``) and the static part of the payload are
+    serialized once, so minting a token only serializes per-token claims and signs.
+    """
+
+    def __init__(self, keys: Optional[KeyRing] = None) -> None:
+        self.key_ring = keys or key_ring
+        self._header_segments: dict[str, bytes] = {}
+        self._static_claims = _jwt_static_claims()
+        # b'"iss":"...","aud":"..."' to be spliced into every payload
+        self._static_segment = orjson.dumps(self._static_claims)[1:-1]
+
+    @property
+    def private_key(self) -> Any:
+        return self.key_ring.active.private_key
+
+    def reload(self) -> None:
+        """Reloads key ring from keys directory."""
+        self.key_ring.load()
+        self._header_segments.clear()
+
+    def _header_segment(self, key: SigningKey) -> bytes:
+        segment = self._header_segments.get(key.kid)
+        if segment is None:
+            header = {'alg': key.algorithm, 'typ': 'JWT', 'kid': key.kid}
+            segment = self._header_segments[key.kid] = base64url_encode(orjson.dumps(header))
+        return segment
+
+    def sign(self, payload: dict) -> str:
+        """Encodes and signs payload with the pre-parsed active private key."""
+        key = self.key_ring.active
+        body = orjson.dumps(payload)
+        if self._static_segment:
+            body = body[:-1] + b',' + self._static_segment + b'}'
+        signing_input = self._header_segment(key) + b'.' + base64url_encode(body)
+        signature = key.algorithm_obj.sign(signing_input, key.private_key)
+        return (signing_input + b'.' + base64url_encode(signature)).decode()
+
+    def mint(
+            self,
+            user_id: int,
+            token_type: JwtTokenTypeEnum,
+            sub: Optional[str] = None,
+            email: Optional[str] = None,
+            device_id: Optional[str] = None,
+    ) -> MintedToken:
+        """Creates token and returns it together with its payload."""
+        iat_ms = _jwt_get_iat_ms()
+        iat = iat_ms // 1000
+        payload = _jwt_dynamic_claims(
+            user_id=user_id,
+            token_type=token_type,
+            iat=iat,
+            sub=sub,
+            email=email,
+            device_id=device_id,
+            orig_iat=iat,
+            iat_ms=iat_ms,
+        )
+        token = self.sign(payload)
+        payload.update(self._static_claims)
+        return MintedToken(token=token, payload=payload)
+
+
+token_minter = TokenMinter()
+
+
 def jwt_encode_handler(payload, private_key: Optional[bytes] = None):
-    key = private_key or settings.jwt_private_key
+    if private_key:
+        return jwt.encode(
+            payload,
+            bytes(private_key),
+            settings.JWT_ALGORITHM
+        )
+    key = key_ring.active
     return jwt.encode(
         payload,
-        bytes(key),
-        settings.JWT_ALGORITHM
+        key.private_key,
+        key.algorithm,
+        headers={'kid': key.kid},
     )
 
 
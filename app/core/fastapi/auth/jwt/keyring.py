@@ -0,0 +1,200 @@
+__all__ = (
+    'get_private_key_name',
+    'get_public_key_name',
+    'key_ring',
+    'KeyRing',
+    'SigningKey',
+)
+
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import orjson
+from cryptography.hazmat.primitives import serialization as crypto_serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jwt.algorithms import Algorithm, get_default_algorithms
+from jwt.utils import base64url_encode
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+RETIRED_PUBLIC_KEY_SUFFIX = '.pub'
+
+_PRIVATE_KEY_TYPES = (rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey, ed25519.Ed25519PrivateKey)
+
+# RFC 7638 required members per key type
+_THUMBPRINT_MEMBERS = {
+    'RSA': ('e', 'kty', 'n'),
+    'EC': ('crv', 'kty', 'x', 'y'),
+    'OKP': ('crv', 'kty', 'x'),
+}
+
+
+def get_key_algorithm(key: Any) -> str:
+    """Returns JWS algorithm name for a private or public key object."""
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return 'RS256'
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        if not isinstance(key.curve, ec.SECP256R1):
+            raise ValueError(f'Unsupported elliptic curve {key.curve.name}')
+        return 'ES256'
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return 'EdDSA'
+    raise ValueError(f'Unsupported key type {type(key).__name__}')
+
+
+def get_private_key_name(kid: str) -> str:
+    """Returns versioned file name of private key."""
+    return f'{settings.JWT_PRIVATE_KEY_NAME}.{kid}'
+
+
+def get_public_key_name(kid: str) -> str:
+    """Returns versioned file name of public key."""
+    return f'{get_private_key_name(kid)}{RETIRED_PUBLIC_KEY_SUFFIX}'
+
+
+def _jwk_thumbprint(jwk: dict) -> str:
+    members = {name: jwk[name] for name in _THUMBPRINT_MEMBERS[jwk['kty']]}
+    digest = hashlib.sha256(orjson.dumps(members, option=orjson.OPT_SORT_KEYS)).digest()
+    return base64url_encode(digest).decode()
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    public_key: Any
+    private_key: Any = None
+    jwk: dict = field(default_factory=dict)
+
+    @property
+    def algorithm_obj(self) -> Algorithm:
+        return get_default_algorithms()[self.algorithm]
+
+    @classmethod
+    def from_key(cls, key: Any) -> 'SigningKey':
+        """Builds signing key from a private key, or a verify-only key from a public key."""
+        algorithm = get_key_algorithm(key)
+        private_key = key if isinstance(key, _PRIVATE_KEY_TYPES) else None
+        public_key = key.public_key() if private_key is not None else key
+        jwk = get_default_algorithms()[algorithm].to_jwk(public_key, as_dict=True)
+        kid = _jwk_thumbprint(jwk)
+        jwk.update(kid=kid, alg=algorithm, use='sig')
+        return cls(kid=kid, algorithm=algorithm, public_key=public_key, private_key=private_key, jwk=jwk)
+
+
+class KeyRing:
+    """Active signing key plus retired verify-only keys, keyed by ``kid``.
+
+    The active key is ``JWT_PRIVATE_KEY_NAME`` in ``JWT_KEYS_DIR``, its public
+    key is read by kid from the versioned ``*.<kid>.pub`` file, or from
+    ``JWT_PUBLIC_KEY_NAME`` for keys not written by rotation. Every other
+    ``*.pub`` file in that directory is a retired key still accepted for
+    verification. The directory is re-scanned at most every
+    ``JWT_KEY_RING_RELOAD_INTERVAL`` seconds, so rotated keys are picked up
+    without a restart.
+    """
+
+    def __init__(self, keys_dir: Optional[str] = None, reload_interval: Optional[int] = None) -> None:
+        self.keys_dir = os.path.abspath(str(keys_dir or settings.JWT_KEYS_DIR))
+        self.reload_interval = (
+            settings.JWT_KEY_RING_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        )
+        self._active: Optional[SigningKey] = None
+        self._keys: dict[str, SigningKey] = {}
+        self._jwks: dict = {'keys': []}
+        self._fingerprint: tuple = ()
+        self._checked_at = 0.0
+
+    def _scan(self) -> tuple:
+        """Returns names and modification times of key files."""
+        try:
+            entries = os.scandir(self.keys_dir)
+        except FileNotFoundError:
+            return ()
+        fingerprint = []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        fingerprint.append((entry.name, entry.stat().st_mtime_ns))
+                except FileNotFoundError:
+                    # deleted by a concurrent rotation
+                    continue
+        return tuple(sorted(fingerprint))
+
+    def _read(self, filename: str) -> bytes:
+        with open(os.path.join(self.keys_dir, filename), 'rb') as fln:
+            return fln.read().strip()
+
+    def load(self) -> None:
+        """Loads active and retired keys from keys directory."""
+        fingerprint = self._scan()
+        private_key = crypto_serialization.load_pem_private_key(
+            self._read(settings.JWT_PRIVATE_KEY_NAME),
+            password=None,
+        )
+        active = SigningKey.from_key(private_key)
+        public_key_name = get_public_key_name(active.kid)
+        if not os.path.exists(os.path.join(self.keys_dir, public_key_name)):
+            public_key_name = settings.JWT_PUBLIC_KEY_NAME
+        public_key = crypto_serialization.load_pem_public_key(self._read(public_key_name))
+        if SigningKey.from_key(public_key).kid != active.kid:
+            raise ValueError(
+                f'{public_key_name} does not match {settings.JWT_PRIVATE_KEY_NAME} in {self.keys_dir}'
+            )
+        keys = {active.kid: active}
+
+        for filename, _ in fingerprint:
+            if filename == settings.JWT_PUBLIC_KEY_NAME or not filename.endswith(RETIRED_PUBLIC_KEY_SUFFIX):
+                continue
+            try:
+                public_key = crypto_serialization.load_pem_public_key(self._read(filename))
+                retired = SigningKey.from_key(public_key)
+            except ValueError:
+                logger.exception('Skipping invalid jwt public key %s', filename)
+                continue
+            keys.setdefault(retired.kid, retired)
+
+        self._active = active
+        self._keys = keys
+        self._jwks = {'keys': [key.jwk for key in keys.values()]}
+        self._fingerprint = fingerprint
+        self._checked_at = time.monotonic()
+        logger.info('Loaded jwt key ring: active kid %s (%s), %d key(s)', active.kid, active.algorithm, len(keys))
+
+    def refresh(self) -> None:
+        """Reloads keys if key files changed since last check."""
+        now = time.monotonic()
+        if self._active is not None and now - self._checked_at < self.reload_interval:
+            return None
+        self._checked_at = now
+        if self._active is None or self._scan() != self._fingerprint:
+            self.load()
+        return None
+
+    @property
+    def active(self) -> SigningKey:
+        self.refresh()
+        return self._active  # type: ignore
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        """Returns key by kid, active key for tokens without kid."""
+        self.refresh()
+        if kid is None:
+            return self._active
+        return self._keys.get(kid)
+
+    def jwks(self) -> dict:
+        """Returns public keys as JWK Set."""
+        self.refresh()
+        return self._jwks
+
+
+key_ring = KeyRing()
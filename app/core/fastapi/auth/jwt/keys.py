@@ -1,31 +1,45 @@
 __all__ = (
     'generate_jwt_keys',
+    'rotate_jwt_keys',
 )
 
 import os
 import logging
+import time
+from typing import Any
 
 from cryptography.hazmat.primitives import serialization as crypto_serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 from cryptography.hazmat.backends import default_backend as crypto_default_backend
 
 from app.core.config import settings
+from app.core.fastapi.auth.jwt.keyring import (
+    get_private_key_name,
+    get_public_key_name,
+    key_ring,
+    RETIRED_PUBLIC_KEY_SUFFIX,
+    SigningKey,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-def generate_jwt_keys() -> None:
-    logger.info('Preparing jwt keys....')
+def _generate_private_key(algorithm: str) -> Any:
+    if algorithm == 'RS256':
+        return rsa.generate_private_key(
+            backend=crypto_default_backend(),
+            public_exponent=65537,
+            key_size=2048
+        )
+    if algorithm == 'ES256':
+        return ec.generate_private_key(ec.SECP256R1(), backend=crypto_default_backend())
+    if algorithm == 'EdDSA':
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f'Unsupported jwt algorithm {algorithm}')
 
-    public_exponent = 65537
-    key_size = 2048
-    key = rsa.generate_private_key(
-        backend=crypto_default_backend(),
-        public_exponent=public_exponent,
-        key_size=key_size
-    )
 
+def _serialize_key_pair(key: Any) -> tuple[bytes, bytes]:
     private_key = key.private_bytes(
         crypto_serialization.Encoding.PEM,
         crypto_serialization.PrivateFormat.PKCS8,
@@ -36,18 +50,102 @@ def generate_jwt_keys() -> None:
         crypto_serialization.Encoding.PEM,
         crypto_serialization.PublicFormat.SubjectPublicKeyInfo
     )
+    return private_key, public_key
+
+
+def _write_atomic(filename: str, data: bytes) -> None:
+    tmp_filename = f'{filename}.tmp'
+    with open(tmp_filename, "wb") as file_out:
+        file_out.write(data)
+    os.replace(tmp_filename, filename)
+
+
+def _symlink_atomic(target: str, filename: str) -> None:
+    tmp_filename = f'{filename}.tmp'
+    if os.path.lexists(tmp_filename):
+        os.remove(tmp_filename)
+    os.symlink(target, tmp_filename)
+    os.replace(tmp_filename, filename)
+
+
+def _activate_key(jwt_keys_dir: str, key: Any) -> str:
+    """Writes key pair under versioned names and makes it active, returns its kid.
+
+    The pair is complete before the single ``os.replace`` of the
+    ``JWT_PRIVATE_KEY_NAME`` link, and the key ring reads the public key by
+    kid, so a new private key is never loaded with an old public key.
+    """
+    kid = SigningKey.from_key(key).kid
+    private_key, public_key = _serialize_key_pair(key)
+    _write_atomic(os.path.join(jwt_keys_dir, get_private_key_name(kid)), private_key)
+    _write_atomic(os.path.join(jwt_keys_dir, get_public_key_name(kid)), public_key)
+    _symlink_atomic(get_private_key_name(kid), os.path.join(jwt_keys_dir, settings.JWT_PRIVATE_KEY_NAME))
+    # kept for readers of the plain public key file, key ring does not need it
+    _symlink_atomic(get_public_key_name(kid), os.path.join(jwt_keys_dir, settings.JWT_PUBLIC_KEY_NAME))
+    return kid
+
+
+def generate_jwt_keys() -> None:
+    """Loads and validates existing jwt keys, generates them only when missing."""
+    logger.info('Preparing jwt keys....')
 
     jwt_keys_dir = os.path.abspath(str(settings.JWT_KEYS_DIR))
 
     private_key_filename = os.path.join(jwt_keys_dir, settings.JWT_PRIVATE_KEY_NAME)
     public_key_filename = os.path.join(jwt_keys_dir, settings.JWT_PUBLIC_KEY_NAME)
-    os.makedirs(jwt_keys_dir, exist_ok=True)
 
     if not os.path.exists(private_key_filename) or not os.path.exists(public_key_filename):
-        with open(private_key_filename, "wb") as file_out:
-            file_out.write(private_key)
+        if not settings.JWT_KEYS_AUTOGENERATE:
+            raise FileNotFoundError(f'Jwt keys are missing in {jwt_keys_dir}')
 
-        with open(public_key_filename, "wb") as file_out:
-            file_out.write(public_key)
+        logger.info('Generating %s jwt keys....', settings.JWT_ALGORITHM)
+        os.makedirs(jwt_keys_dir, exist_ok=True)
+        _activate_key(jwt_keys_dir, _generate_private_key(settings.JWT_ALGORITHM))
 
+    key_ring.load()
     return None
+
+
+def rotate_jwt_keys() -> str:
+    """Generates new active key with ``JWT_ALGORITHM``, keeps the old one for verification.
+
+    The previous public key is kept as a retired ``*.pub`` file until
+    ``JWT_RETIRED_KEY_MAX_AGE`` seconds pass, so tokens signed with it stay valid.
+    Its private key is deleted. Running workers pick the new key up on their
+    next key ring reload.
+
+    :return: kid of the new active key
+    """
+    jwt_keys_dir = os.path.abspath(str(settings.JWT_KEYS_DIR))
+    private_key_filename = os.path.join(jwt_keys_dir, settings.JWT_PRIVATE_KEY_NAME)
+    os.makedirs(jwt_keys_dir, exist_ok=True)
+
+    if os.path.exists(private_key_filename):
+        with open(private_key_filename, 'rb') as file_in:
+            previous_key = crypto_serialization.load_pem_private_key(file_in.read(), password=None)
+        previous = SigningKey.from_key(previous_key)
+        _, previous_public_key = _serialize_key_pair(previous_key)
+        # rewritten even if it exists, retired key age is counted from its modification time
+        _write_atomic(os.path.join(jwt_keys_dir, get_public_key_name(previous.kid)), previous_public_key)
+
+    kid = _activate_key(jwt_keys_dir, _generate_private_key(settings.JWT_ALGORITHM))
+
+    expired_before = time.time() - settings.JWT_RETIRED_KEY_MAX_AGE
+    versioned_prefix = get_private_key_name('')
+    with os.scandir(jwt_keys_dir) as entries:
+        for entry in entries:
+            if entry.is_symlink() or entry.name in (get_private_key_name(kid), get_public_key_name(kid)):
+                continue
+            if entry.name.endswith(RETIRED_PUBLIC_KEY_SUFFIX):
+                if entry.stat().st_mtime < expired_before:
+                    os.remove(entry.path)
+            elif entry.name.startswith(versioned_prefix) and not entry.name.endswith('.tmp'):
+                # private key of a retired version
+                os.remove(entry.path)
+
+    logger.info('Rotated jwt keys, new active kid %s (%s)', kid, settings.JWT_ALGORITHM)
+    return kid
+
+
+if __name__ == '__main__':
+    rotate_jwt_keys()
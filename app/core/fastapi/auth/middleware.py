@@ -1,77 +1,81 @@
 __all__ = (
     'CustomAuthBackend',
+    'AuthMiddleware',
 )
 
 import logging
-from calendar import timegm
+from typing import Optional
 
-from fastapi.security import HTTPBearer
-from fastapi.security.utils import get_authorization_scheme_param
 import jwt
-from jwt import InvalidIssuedAtError, ExpiredSignatureError
+from fastapi.security.utils import get_authorization_scheme_param
 from starlette.authentication import (
     AuthCredentials,
     AuthenticationBackend,
     AuthenticationError,
+    UnauthenticatedUser,
 )
-from tortoise import timezone
-from tortoise.exceptions import DoesNotExist
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.core.config import settings
+from app.core.enums.jwt import JwtTokenTypeEnum
+from app.core.fastapi.auth.jwt.jwt import jwt_decode_handler
 from app.core.fastapi.auth.models import CustomUser
-from app.models.db import User
 
 
 logger = logging.getLogger(__name__)
-security = HTTPBearer()
 
 
 class CustomAuthBackend(AuthenticationBackend):
+    """Authenticates request by access token claims only, without database or cache lookups."""
 
-    async def authenticate(self, request):  # noqa
+    async def authenticate(self, conn: HTTPConnection) -> Optional[tuple[AuthCredentials, CustomUser]]:  # noqa
         # Get JWT token from auth header
-        authorization: str = request.headers.get('Authorization')
-        scheme, credentials = get_authorization_scheme_param(authorization)
-        if scheme.lower() != 'bearer':
-            raise AuthenticationError('Invalid basic auth credentials')
+        authorization: Optional[str] = conn.headers.get('Authorization')
+        if not authorization:
+            return None
 
-        if not credentials:
+        scheme, credentials = get_authorization_scheme_param(authorization)
+        if scheme.lower() != 'bearer' or not credentials:
             raise AuthenticationError('Invalid basic auth credentials')
 
-        # Checks the validity of the JWT token, if token is invalid returns UnauthenticatedUser object
+        # Checks signature, expiration, audience and issuer of the JWT token
         try:
-            jwt_decoded = jwt.decode(
-                credentials,
-                settings.JWT_PUBLIC_KEY,
-                algorithms=[settings.JWT_ALG]
-            )
-            self._validate_iat(payload=jwt_decoded, leeway=settings.JWT_LEEWAY)
-        except (jwt.PyJWTError, jwt.InvalidAlgorithmError) as exc:
-            logger.exception(str(exc))
-            raise AuthenticationError('Invalid basic auth credentials')
+            payload = jwt_decode_handler(credentials)
+        except jwt.PyJWTError as exc:
+            raise AuthenticationError(str(exc))
+
+        if payload.get('type') != JwtTokenTypeEnum.access.value:
+            raise AuthenticationError('Invalid token type')
+
+        return AuthCredentials(['authenticated']), CustomUser.from_payload(payload)
 
-        try:
-            user = await User.get(id=jwt_decoded['user_id'])
-        except DoesNotExist:
-            logger.exception(
-                'User %s or user device %s does not exists!',
-                jwt_decoded['user_id'],
-                jwt_decoded['device_id'],
-            )
-            raise AuthenticationError('Invalid basic auth credentials')
 
-        user_description = user.to_dict()
+class AuthMiddleware:
+    """Pure ASGI middleware which sets ``scope['user']`` and ``scope['auth']``.
 
-        return AuthCredentials(['authenticated']), CustomUser(**user_description)
+    Unlike starlette ``AuthenticationMiddleware`` it never rejects a request:
+    invalid credentials leave an unauthenticated user and the error in
+    ``scope['auth_error']``, so routes which do not need authentication work as
+    before and routes which do decide how to respond.
+    """
 
-    @staticmethod
-    def _validate_iat(payload, leeway):
-        now = timegm(timezone.now().utctimetuple())
+    def __init__(self, app: ASGIApp, backend: Optional[AuthenticationBackend] = None) -> None:
+        self.app = app
+        self.backend = backend or CustomAuthBackend()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        auth_result = None
+        scope['auth_error'] = None
         try:
-            iat = int(payload['iat'])
-        except ValueError:
-            raise InvalidIssuedAtError(
-                'Issued At claim (iat) must be an integer.'
-            )
-        if now - iat - leeway > settings.JWT_MAX_AGE:
-            raise ExpiredSignatureError('Signature has expired')
+            auth_result = await self.backend.authenticate(HTTPConnection(scope))
+        except AuthenticationError as exc:
+            scope['auth_error'] = str(exc)
+
+        if auth_result is None:
+            auth_result = AuthCredentials(), UnauthenticatedUser()
+        scope['auth'], scope['user'] = auth_result
+        await self.app(scope, receive, send)
@@ -6,6 +6,8 @@ from typing import Dict
 
 from starlette.authentication import BaseUser
 
+from app.core.fastapi.auth.jwt.jwt import get_token_issued_at_ms
+
 
 class CustomUser(BaseUser):
     def __init__(self, id: int, **kwargs) -> None:  # noqa
@@ -15,6 +17,19 @@ class CustomUser(BaseUser):
         self.last_name = kwargs.get('last_name')
         self.initials = kwargs.get('initials')
         self.device_id = kwargs.get('device_id')
+        self.token_id = kwargs.get('token_id')
+        self.issued_at_ms = kwargs.get('issued_at_ms')
+
+    @classmethod
+    def from_payload(cls, payload: Dict) -> 'CustomUser':
+        """Builds user from access token claims."""
+        return cls(
+            id=payload['user_id'],
+            email=payload.get('email'),
+            device_id=payload.get('device_id'),
+            token_id=payload.get('jti'),
+            issued_at_ms=get_token_issued_at_ms(payload),
+        )
 
     @property
     def is_authenticated(self) -> bool:
@@ -0,0 +1,23 @@
+__all__ = (
+    'UserIdentityMapMiddleware',
+)
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.identity_map import user_identity_map_context
+
+
+class UserIdentityMapMiddleware:
+    """Pure ASGI middleware which opens a user identity map for every request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        with user_identity_map_context() as identity_map:
+            scope['user_identity_map'] = identity_map
+            await self.app(scope, receive, send)
@@ -0,0 +1,258 @@
+__all__ = (
+    'JobQueue',
+    'JobWorker',
+)
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from functools import partial
+from typing import Awaitable, Callable, Optional
+
+import orjson
+from redis import RedisError
+
+from app.core.config import settings
+from app.core.storage import RedisBatch
+
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable]
+
+
+class JobQueue:
+    """Enqueues jobs to a redis stream processed by ``JobWorker``.
+
+    Job is a message with single ``job`` field, json of its name, kwargs,
+    unique id and number of failed attempts. Messages are deleted from the
+    stream when they are acknowledged, dead letters are kept for
+    ``JOBS_DEAD_LETTER_MAX_AGE`` seconds.
+    """
+    # keys share hash tag, delayed jobs are moved to the stream by one script
+    STREAM_KEY = '{jobs}'
+    DELAYED_KEY = '{jobs}-delayed'
+    DEAD_LETTER_STREAM_KEY = '{jobs}-dead'
+    FIELD = 'job'
+
+    def __init__(self, storage) -> None:
+        self.storage = storage
+
+    @staticmethod
+    def dumps(name: str, kwargs: dict, attempt: int = 0, job_id: Optional[str] = None) -> bytes:
+        return orjson.dumps({'id': job_id or uuid.uuid4().hex, 'name': name, 'kwargs': kwargs, 'attempt': attempt})
+
+    @staticmethod
+    def get_dead_letter_min_id() -> str:
+        """Returns id of the oldest dead letter which is kept."""
+        return f'{int((time.time() - settings.JOBS_DEAD_LETTER_MAX_AGE) * 1000)}-0'
+
+    def add(self, batch: RedisBatch, name: str, **kwargs) -> RedisBatch:
+        """Queues job enqueue to batch."""
+        return batch.send(self.STREAM_KEY, fields={self.FIELD: self.dumps(name, kwargs)})
+
+    async def enqueue(self, name: str, **kwargs) -> bytes:
+        return await self.storage.send(self.STREAM_KEY, fields={self.FIELD: self.dumps(name, kwargs)})
+
+
+class JobWorker:
+    """Runs jobs from ``JobQueue`` stream concurrently in one event loop.
+
+    Jobs are read in batches with XREADGROUP, up to ``concurrency`` of them run
+    at once. Failed jobs are retried with exponential backoff through a delayed
+    sorted set and moved to dead letter stream after ``max_attempts``. Acks,
+    retries and dead letters are written in one transaction per loop iteration.
+    Jobs left unacknowledged by a dead consumer are claimed after
+    ``claim_idle_time`` seconds, so every job runs at least once. Jobs of this
+    consumer which are still running are never claimed again.
+    """
+    GROUP = 'jobs-workers'
+    CLAIM_INTERVAL = 10
+
+    def __init__(
+            self,
+            storage,
+            handlers: dict[str, JobHandler],
+            consumer: Optional[str] = None,
+            concurrency: Optional[int] = None,
+            batch_size: Optional[int] = None,
+            max_attempts: Optional[int] = None,
+            backoff: Optional[float] = None,
+            backoff_max: Optional[float] = None,
+            claim_idle_time: Optional[int] = None,
+            block: int = 1000,
+    ) -> None:
+        self.storage = storage
+        self.handlers = handlers
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+        self.concurrency = concurrency or settings.JOBS_CONCURRENCY or settings.MAIL_POOL_SIZE
+        self.batch_size = batch_size or settings.JOBS_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        self.backoff = backoff or settings.JOBS_BACKOFF
+        self.backoff_max = backoff_max or settings.JOBS_BACKOFF_MAX
+        self.claim_idle_time = claim_idle_time or settings.JOBS_CLAIM_IDLE_TIME
+        self.block = block
+        self._running: set[asyncio.Task] = set()
+        self._running_ids: set[bytes] = set()
+        self._acks: list[bytes] = []
+        self._retries: list[tuple[bytes, float]] = []
+        self._dead: list[bytes] = []
+        self._claimed_at = 0.0
+        self._stopping = False
+        self.done = 0
+        self.retried = 0
+        self.dead = 0
+
+    def get_backoff(self, attempt: int) -> float:
+        """Seconds to wait before attempt, exponential with jitter."""
+        return min(self.backoff * 2 ** (attempt - 1), self.backoff_max) * random.uniform(0.5, 1)
+
+    async def _run_job(self, message_id: bytes, fields: dict) -> None:
+        job = {}
+        try:
+            job = orjson.loads(fields[JobQueue.FIELD.encode()])
+            handler = self.handlers.get(job['name'])
+            if handler is None:
+                raise LookupError(f'Unknown job [{job["name"]}]')
+            await handler(**job['kwargs'])
+            self.done += 1
+        except Exception as exc:  # noqa
+            attempt = job.get('attempt', 0) + 1
+            if attempt < self.max_attempts and job.get('name') in self.handlers:
+                logger.warning('Job [%s] failed, attempt [%s]: %r', job.get('name'), attempt, exc)
+                self._retries.append((
+                    JobQueue.dumps(job['name'], job['kwargs'], attempt=attempt, job_id=job['id']),
+                    time.time() + self.get_backoff(attempt),
+                ))
+                self.retried += 1
+            else:
+                logger.error('Job [%s] failed, moved to dead letters: %r', job.get('name'), exc)
+                self._dead.append(orjson.dumps({
+                    **job,
+                    'attempt': attempt,
+                    'message_id': message_id.decode(),
+                    'error': repr(exc),
+                }))
+                self.dead += 1
+        self._acks.append(message_id)
+
+    def _start(self, message_id: bytes, fields: dict) -> None:
+        task = asyncio.create_task(self._run_job(message_id, fields))
+        self._running.add(task)
+        self._running_ids.add(message_id)
+        task.add_done_callback(partial(self._finish, message_id))
+
+    def _finish(self, message_id: bytes, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self._running_ids.discard(message_id)
+
+    async def _flush(self) -> None:
+        """Writes acks, retries and dead letters of finished jobs in one transaction."""
+        if not self._acks:
+            return
+        acks, self._acks = self._acks, []
+        retries, self._retries = self._retries, []
+        dead, self._dead = self._dead, []
+        batch = self.storage.batch()
+        for job, due_at in retries:
+            batch.schedule(JobQueue.DELAYED_KEY, job, due_at=due_at)
+        for job in dead:
+            batch.send(
+                JobQueue.DEAD_LETTER_STREAM_KEY,
+                fields={JobQueue.FIELD: job},
+                min_id=JobQueue.get_dead_letter_min_id(),
+            )
+        # group is the only reader of the stream, processed messages are not needed anymore
+        batch.ack(JobQueue.STREAM_KEY, self.GROUP, *acks).delete_messages(JobQueue.STREAM_KEY, *acks)
+        try:
+            await batch.execute()
+        except RedisError:
+            logger.warning(
+                'Job worker [%s] failed to flush finished jobs [%s], they are kept to be flushed again',
+                self.consumer, ', '.join(message_id.decode() for message_id in acks),
+            )
+            # jobs would be claimed and run again after restart otherwise
+            self._acks, self._retries, self._dead = acks + self._acks, retries + self._retries, dead + self._dead
+            raise
+
+    async def _claim_idle(self) -> None:
+        if time.monotonic() - self._claimed_at < self.CLAIM_INTERVAL:
+            return
+        self._claimed_at = time.monotonic()
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return
+        _, messages, *_ = await self.storage.claim_idle(
+            JobQueue.STREAM_KEY,
+            self.GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle_time * 1000,
+            count=free + len(self._running_ids),
+        )
+        claimed = 0
+        for message_id, fields in messages:
+            if message_id in self._running_ids or message_id in self._acks:
+                # own job which is still running or waits for its ack
+                continue
+            if fields:
+                self._start(message_id, fields)
+                claimed += 1
+            else:
+                # message was trimmed from the stream, only its pending entry is left
+                self._acks.append(message_id)
+        if claimed:
+            logger.info('Jobs of dead consumers were claimed: [%s]', claimed)
+
+    async def _poll(self) -> None:
+        await self._flush()
+        await self.storage.send_due(JobQueue.DELAYED_KEY, JobQueue.STREAM_KEY, field=JobQueue.FIELD,
+                                    count=self.batch_size)
+        await self._claim_idle()
+
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+            return
+        response = await self.storage.read_group(
+            JobQueue.STREAM_KEY,
+            self.GROUP,
+            self.consumer,
+            count=min(free, self.batch_size),
+            block=self.block,
+        )
+        for _, messages in response or ():
+            for message_id, fields in messages:
+                self._start(message_id, fields)
+
+    async def run(self) -> None:
+        await self.storage.create_group(JobQueue.STREAM_KEY, self.GROUP)
+        logger.info('Job worker [%s] started, jobs: %s', self.consumer, ', '.join(self.handlers))
+        while not self._stopping:
+            try:
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa
+                logger.exception('Job worker [%s] failed to poll jobs', self.consumer)
+                await asyncio.sleep(1)
+
+        if self._running:
+            await asyncio.wait(self._running)
+        await self._flush()
+        logger.info('Job worker [%s] stopped: %s', self.consumer, self.stats())
+
+    def stop(self) -> None:
+        """Stops reading new jobs, ``run`` returns after running ones are finished."""
+        self._stopping = True
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self._running),
+            'done': self.done,
+            'retried': self.retried,
+            'dead': self.dead,
+        }
@@ -0,0 +1,146 @@
+__all__ = (
+    'AsyncSMTPConnectionPool',
+)
+
+import asyncio
+import logging
+import ssl
+import time
+from email.message import EmailMessage
+from typing import Optional
+
+import aiosmtplib
+
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncPooledConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.sent = 0
+        self.used_at = time.monotonic()
+
+
+class AsyncSMTPConnectionPool:
+    """Pool of authenticated SMTP connections reused for many messages, driven by aiosmtplib.
+
+    Connections are opened lazily and are recycled after ``max_messages``
+    messages. A connection idle for more than ``idle_check`` seconds is probed
+    with NOOP before use. A message which fails because the server dropped the
+    connection is resent once over a new one. At most ``size`` messages are sent
+    at once, one per connection, so ``size`` is the number of concurrent sends
+    the SMTP server has to accept. Pool is bound to the event loop it is used in
+    and is not shared between processes, every worker opens its own.
+    """
+    RECONNECT_ERRORS = (aiosmtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            username: Optional[str] = None,
+            password: Optional[str] = None,
+            starttls: bool = True,
+            size: int = 2,
+            max_messages: int = 100,
+            idle_check: float = 30,
+            timeout: float = 30,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self._idle: list[_AsyncPooledConnection] = []
+        self._slots = asyncio.BoundedSemaphore(size)
+        self.connects = 0
+        self.sent = 0
+
+    async def _connect(self) -> _AsyncPooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            timeout=self.timeout,
+            start_tls=self.starttls,
+            tls_context=ssl.create_default_context() if self.starttls else None,
+        )
+        await smtp.connect()
+        try:
+            if self.username:
+                await smtp.login(self.username, self.password)
+        except (aiosmtplib.SMTPException, OSError):
+            await self._close(smtp)
+            raise
+        self.connects += 1
+        return _AsyncPooledConnection(smtp)
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+    async def _is_alive(self, connection: _AsyncPooledConnection) -> bool:
+        if time.monotonic() - connection.used_at < self.idle_check:
+            return connection.smtp.is_connected
+        try:
+            return (await connection.smtp.noop()).code == 250
+        except (aiosmtplib.SMTPException, OSError):
+            return False
+
+    async def _acquire(self) -> _AsyncPooledConnection:
+        while self._idle:
+            connection = self._idle.pop()
+            if await self._is_alive(connection):
+                return connection
+            await self._close(connection.smtp)
+        return await self._connect()
+
+    async def _release(self, connection: _AsyncPooledConnection) -> None:
+        connection.used_at = time.monotonic()
+        if connection.sent >= self.max_messages:
+            await self._close(connection.smtp)
+        else:
+            self._idle.append(connection)
+
+    async def send(self, *messages: EmailMessage) -> None:
+        """Sends messages one after another over a single pooled connection."""
+        async with self._slots:
+            connection = await self._acquire()
+            try:
+                for message in messages:
+                    if connection.sent >= self.max_messages:
+                        await self._close(connection.smtp)
+                        connection = await self._connect()
+                    try:
+                        await connection.smtp.send_message(message)
+                    except self.RECONNECT_ERRORS:
+                        logger.warning('SMTP connection to [%s] was lost, reconnecting', self.host)
+                        connection.smtp.close()
+                        connection = await self._connect()
+                        await connection.smtp.send_message(message)
+                    connection.sent += 1
+                    self.sent += 1
+            except (aiosmtplib.SMTPException, OSError, asyncio.CancelledError):
+                # connection may be left in the middle of a command
+                connection.smtp.close()
+                raise
+            await self._release(connection)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._close(connection.smtp)
+
+    def stats(self) -> dict:
+        return {
+            'idle': len(self._idle),
+            'connects': self.connects,
+            'sent': self.sent,
+        }
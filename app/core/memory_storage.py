@@ -0,0 +1,498 @@
+__all__ = (
+    'MemoryStorage',
+    'MemoryBatch',
+)
+
+import asyncio
+import fnmatch
+import math
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Optional, Union
+
+from app.core.storage import CacheStorage
+from app.core.timing_wheel import TimingWheel
+
+
+WRONG_TYPE_ERROR = 'WRONGTYPE Operation against a key holding the wrong kind of value'
+
+# sizes of CPython objects not referenced by the size of their container
+_FLOAT_SIZE = sys.getsizeof(0.0)
+_STREAM_ID_SIZE = sys.getsizeof((0, 0)) + 2 * sys.getsizeof(2 ** 40)
+
+
+def _encode(value: Union[bytes, str, int, float]) -> bytes:
+    """Encodes value the way redis client sends it."""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, (int, float)):
+        value = repr(value)
+    return value.encode()
+
+
+def _parse_id(value: Union[bytes, str], seq: int) -> tuple[int, int]:
+    """Parses ``ms-seq`` stream id, seq defaults to given one if id has only ms part."""
+    if isinstance(value, bytes):
+        value = value.decode()
+    ms, _, seq_part = value.partition('-')
+    return int(ms), int(seq_part) if seq_part else seq
+
+
+def _format_id(stream_id: tuple[int, int]) -> bytes:
+    return f'{stream_id[0]}-{stream_id[1]}'.encode()
+
+
+class _Stream:
+    """Messages ordered by id, kept in two parallel lists to bisect ids."""
+    __slots__ = ('ids', 'messages', 'last_id', 'memory')
+
+    def __init__(self) -> None:
+        self.ids: list[tuple[int, int]] = []
+        self.messages: list[dict[bytes, bytes]] = []
+        self.last_id = (0, 0)
+        self.memory = sys.getsizeof(self)
+
+    @staticmethod
+    def _sizeof(fields: dict[bytes, bytes]) -> int:
+        return _STREAM_ID_SIZE + sys.getsizeof(fields) + sum(
+            sys.getsizeof(field) + sys.getsizeof(value) for field, value in fields.items()
+        )
+
+    def add(self, fields: dict[bytes, bytes]) -> tuple[int, int]:
+        ms = int(time.time() * 1000)
+        stream_id = (ms, 0) if ms > self.last_id[0] else (self.last_id[0], self.last_id[1] + 1)
+        self.ids.append(stream_id)
+        self.messages.append(fields)
+        self.last_id = stream_id
+        self.memory += self._sizeof(fields)
+        return stream_id
+
+    def trim(self, min_id: tuple[int, int]) -> None:
+        """Removes messages with ids lower than min_id."""
+        end = bisect_left(self.ids, min_id)
+        if end:
+            self.memory -= sum(map(self._sizeof, self.messages[:end]))
+            del self.ids[:end]
+            del self.messages[:end]
+
+    def range(self, start: int, end: int, count: Optional[int]) -> list[tuple[bytes, dict]]:
+        if count is not None:
+            end = min(end, start + count)
+        return [(_format_id(self.ids[index]), dict(self.messages[index])) for index in range(start, end)]
+
+
+class MemoryBatch:
+    """Queues ``MemoryStorage`` commands and runs them at once in ``execute``.
+
+    Commands run without awaiting in between, so every batch is atomic.
+    """
+
+    def __init__(self, storage: 'MemoryStorage') -> None:
+        self.storage = storage
+        self._commands: list[tuple[Callable, tuple, dict]] = []
+
+    def _add(self, command: Callable, *args, **kwargs) -> 'MemoryBatch':
+        self._commands.append((command, args, kwargs))
+        return self
+
+    def delete(self, *, key: str) -> 'MemoryBatch':
+        return self._add(self.storage._delete, key)
+
+    def set(self, *, key: str, value: Union[str, int] = 0, exp: int, nx: bool = False) -> 'MemoryBatch':
+        return self._add(self.storage._set, key, value, exp, nx)
+
+    def get(self, *, key: str) -> 'MemoryBatch':
+        return self._add(self.storage._get, key)
+
+    def set_add(self, key: str, value: str) -> 'MemoryBatch':
+        return self._add(self.storage._set_add, key, value)
+
+    def value_in_set(self, key: str, value: str) -> 'MemoryBatch':
+        return self._add(self.storage._value_in_set, key, value)
+
+    def delete_set_value(self, key: str, value: str) -> 'MemoryBatch':
+        return self._add(self.storage._delete_set_value, key, value)
+
+    def send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> 'MemoryBatch':
+        return self._add(self.storage._send, stream_key, fields, min_id)
+
+    def schedule(self, key: str, value: Union[bytes, str], due_at: float) -> 'MemoryBatch':
+        return self._add(self.storage._schedule, key, value, due_at)
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [command(*args, **kwargs) for command, args, kwargs in commands]
+
+
+class MemoryStorage(CacheStorage):
+    """Storage kept in process memory, a replacement of redis for single process deployments.
+
+    Values are stored as redis returns them: strings as bytes, sets as sets of
+    bytes, sorted sets as dicts of member scores, token buckets as tuples and
+    streams as parallel lists of ids and messages. Key expiration is tracked by
+    a hierarchical timing wheel advanced on every command, expired keys are
+    also never returned before the wheel reaches them. Commands of redis
+    scripts run without awaiting, so they are atomic like the scripts.
+
+    Consumer groups are not implemented, the job worker runs in a separate
+    process which cannot share this storage.
+    """
+    WHEEL_RESOLUTION = 1.0
+
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        self.wheel = TimingWheel(resolution=self.WHEEL_RESOLUTION, now=time.time())
+        self._readers: dict[str, set[asyncio.Future]] = {}
+        # approximate size of keys and values in bytes
+        self.memory = 0
+        self.expired = 0
+
+    async def close(self) -> None:
+        return None
+
+    def batch(self, transaction: bool = True) -> MemoryBatch:
+        """Returns batch to run several commands at once, it is always atomic."""
+        return MemoryBatch(self)
+
+    @staticmethod
+    def _sizeof(key: str, value: Any) -> int:
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(value, set):
+            size += sum(map(sys.getsizeof, value))
+        elif isinstance(value, dict):
+            size += sum(sys.getsizeof(member) + _FLOAT_SIZE for member in value)
+        elif isinstance(value, tuple):
+            size += _FLOAT_SIZE * len(value)
+        elif isinstance(value, _Stream):
+            size = sys.getsizeof(key) + value.memory
+        return size
+
+    def _expire(self) -> None:
+        for key in self.wheel.advance(time.time()):
+            self.memory -= self._sizeof(key, self._data.pop(key))
+            self.expired += 1
+
+    def _lookup(self, key: str, kind: Optional[type] = None) -> Any:
+        """Returns unexpired value of key or None, checks its type."""
+        self._expire()
+        value = self._data.get(key)
+        if value is None:
+            return None
+        deadline = self.wheel.deadline(key)
+        if deadline is not None and deadline <= time.time():
+            self._remove(key)
+            self.expired += 1
+            return None
+        if kind is not None and not isinstance(value, kind):
+            raise TypeError(WRONG_TYPE_ERROR)
+        return value
+
+    def _store(self, key: str, value: Any, expire_at: Optional[float] = None) -> None:
+        """Replaces value of key, key expires at expire_at or never."""
+        if key in self._data:
+            self.memory -= self._sizeof(key, self._data[key])
+        self._data[key] = value
+        self.memory += self._sizeof(key, value)
+        self._expire_at(key, expire_at)
+
+    def _expire_at(self, key: str, expire_at: Optional[float]) -> None:
+        if expire_at is None:
+            self.wheel.cancel(key)
+        elif not self.wheel.schedule(key, expire_at):
+            self._remove(key)
+
+    def _remove(self, key: str) -> bool:
+        value = self._data.pop(key, None)
+        if value is None:
+            return False
+        self.memory -= self._sizeof(key, value)
+        self.wheel.cancel(key)
+        return True
+
+    def _resize(self, key: str, container: Any, size: int, delta: int) -> None:
+        """Accounts in place change of container, removes it once it is empty like redis does."""
+        self.memory += sys.getsizeof(container) - size + delta
+        if not container:
+            self._remove(key)
+
+    def _delete(self, key: str) -> int:
+        self._expire()
+        return int(self._remove(key))
+
+    def _set(self, key: str, value: Union[str, int], exp: Optional[int], nx: bool = False) -> Optional[bool]:
+        self._expire()
+        if nx and self._lookup(key) is not None:
+            return None
+        self._store(key, _encode(value), None if exp is None else time.time() + exp)
+        return True
+
+    def _get(self, key: str) -> Optional[bytes]:
+        return self._lookup(key, bytes)
+
+    def _set_add(self, key: str, value: str) -> int:
+        members = self._lookup(key, set)
+        if members is None:
+            members = set()
+            self._store(key, members)
+        member = _encode(value)
+        if member in members:
+            return 0
+        size = sys.getsizeof(members)
+        members.add(member)
+        self._resize(key, members, size, sys.getsizeof(member))
+        return 1
+
+    def _value_in_set(self, key: str, value: str) -> bool:
+        members = self._lookup(key, set)
+        return members is not None and _encode(value) in members
+
+    def _delete_set_value(self, key: str, value: str) -> int:
+        members = self._lookup(key, set)
+        member = _encode(value)
+        if members is None or member not in members:
+            return 0
+        size = sys.getsizeof(members)
+        members.remove(member)
+        self._resize(key, members, size, -sys.getsizeof(member))
+        return 1
+
+    def _send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> bytes:
+        stream = self._lookup(stream_key, _Stream)
+        if stream is None:
+            stream = _Stream()
+            self._store(stream_key, stream)
+        self.memory -= stream.memory
+        stream_id = stream.add({_encode(field): _encode(value) for field, value in fields.items()})
+        if min_id is not None:
+            stream.trim(_parse_id(min_id, 0))
+        self.memory += stream.memory
+        for reader in self._readers.pop(stream_key, ()):
+            if not reader.done():
+                reader.set_result(None)
+        return _format_id(stream_id)
+
+    def _schedule(self, key: str, value: Union[bytes, str], due_at: float) -> int:
+        scores = self._lookup(key, dict)
+        if scores is None:
+            scores = {}
+            self._store(key, scores)
+        member = _encode(value)
+        added = member not in scores
+        size = sys.getsizeof(scores)
+        scores[member] = float(due_at)
+        self._resize(key, scores, size, sys.getsizeof(member) + _FLOAT_SIZE if added else 0)
+        return int(added)
+
+    async def delete(self, *, key: str) -> Any:
+        return self._delete(key)
+
+    async def set(self, *, key: str, value: Union[str, int] = 0, exp: int) -> Any:
+        return self._set(key, value, exp)
+
+    async def get(self, *, key: str) -> Any:
+        return self._get(key)
+
+    async def set_default(self, *, key: str, value: Union[str, bytes]) -> Any:
+        stored_value = self._lookup(key, bytes)
+        if stored_value is not None:
+            return stored_value
+        self._store(key, _encode(value))
+        return value
+
+    async def increment(self, *, key: str, amount: int = 1) -> int:
+        value = int(self._lookup(key, bytes) or 0) + amount
+        if key in self._data:
+            # like INCRBY, keeps expiration of key
+            self.memory -= self._sizeof(key, self._data[key])
+            self._data[key] = _encode(value)
+            self.memory += self._sizeof(key, self._data[key])
+        else:
+            self._store(key, _encode(value))
+        return value
+
+    async def delete_if_equal(self, *, key: str, value: Union[str, int]) -> bool:
+        if self._lookup(key, bytes) != _encode(value):
+            return False
+        return self._remove(key)
+
+    async def take_tokens(self, buckets: list[tuple[str, float, float]], cost: float = 1) -> tuple[bool, list[float]]:
+        now = time.time()
+        tokens = []
+        for key, rate, capacity in buckets:
+            value, updated_at = self._lookup(key, tuple) or (capacity, now)
+            tokens.append(min(capacity, value + max(0.0, now - updated_at) * rate))
+        taken = all(value >= cost for value in tokens)
+        for index, (key, rate, capacity) in enumerate(buckets):
+            tokens[index] -= cost * taken
+            self._store(key, (tokens[index], now), now + math.ceil(capacity / rate * 1000) / 1000)
+        return taken, [math.floor(value * 1000) / 1000 for value in tokens]
+
+    async def get_many(self, *, keys: list[str]) -> list:
+        return [self._get(key) for key in keys]
+
+    def _expiring_set_add(self, key: str, scores: dict, member: bytes, expire_at: int) -> None:
+        """Prunes expired members, adds member and moves key expiration to the newest member."""
+        now = time.time()
+        size = sys.getsizeof(scores)
+        removed = [expired for expired, score in scores.items() if score <= now]
+        for expired in removed:
+            del scores[expired]
+        added = member not in scores
+        scores[member] = float(expire_at)
+        self.memory += sys.getsizeof(scores) - size + (sys.getsizeof(member) + _FLOAT_SIZE) * added - sum(
+            sys.getsizeof(expired) + _FLOAT_SIZE for expired in removed
+        )
+        self._expire_at(key, max(scores.values()))
+
+    async def expiring_set_add(self, key: str, value: str, expire_at: int) -> int:
+        scores = self._lookup(key, dict)
+        if scores is None:
+            scores = {}
+            self._store(key, scores)
+        self._expiring_set_add(key, scores, _encode(value), expire_at)
+        return 1
+
+    async def value_in_expiring_set(self, key: str, value: str) -> bool:
+        scores = self._lookup(key, dict)
+        expire_at = None if scores is None else scores.get(_encode(value))
+        return expire_at is not None and expire_at > time.time()
+
+    async def delete_expiring_set_value(self, key: str, value: str) -> int:
+        scores = self._lookup(key, dict)
+        member = _encode(value)
+        if scores is None or member not in scores:
+            return 0
+        size = sys.getsizeof(scores)
+        del scores[member]
+        self._resize(key, scores, size, -sys.getsizeof(member) - _FLOAT_SIZE)
+        return 1
+
+    async def replace_expiring_set_value(self, key: str, value: str, new_value: str, expire_at: int) -> bool:
+        scores = self._lookup(key, dict)
+        member = _encode(value)
+        if scores is None or scores.get(member, 0) <= time.time():
+            return False
+        size = sys.getsizeof(scores)
+        del scores[member]
+        self.memory += sys.getsizeof(scores) - size - sys.getsizeof(member) - _FLOAT_SIZE
+        self._expiring_set_add(key, scores, _encode(new_value), expire_at)
+        return True
+
+    def _match(self, match: str, kind: Optional[type] = None) -> list[str]:
+        self._expire()
+        return [
+            key for key, value in self._data.items()
+            if fnmatch.fnmatchcase(key, match) and (kind is None or isinstance(value, kind))
+        ]
+
+    async def prune_expiring_sets(self, match: str, count: int = 500) -> int:
+        removed = 0
+        now = time.time()
+        for key in self._match(match, dict):
+            scores = self._data[key]
+            expired = [member for member, score in scores.items() if score <= now]
+            if expired:
+                size = sys.getsizeof(scores)
+                for member in expired:
+                    del scores[member]
+                self._resize(key, scores, size, -sum(sys.getsizeof(member) + _FLOAT_SIZE for member in expired))
+                removed += len(expired)
+        return removed
+
+    async def delete_keys(self, match: str, key_type: Optional[str] = None, count: int = 500) -> int:
+        kind = {'string': bytes, 'set': set, 'zset': dict, 'hash': tuple, 'stream': _Stream, None: None}[key_type]
+        return sum(self._remove(key) for key in self._match(match, kind))
+
+    def _read_after(self, stream_key: str, last_id: tuple[int, int], count: Optional[int]) -> list:
+        stream = self._lookup(stream_key, _Stream)
+        if stream is None:
+            return []
+        return stream.range(bisect_right(stream.ids, last_id), len(stream.ids), count)
+
+    async def read(
+            self,
+            stream_key: str,
+            last_msg_id: Union[bytes, int] = b'$',
+            count: Optional[int] = None,
+            block: Optional[int] = 0,
+    ) -> Any:
+        """Reads messages after last_msg_id like XREAD, waits up to block milliseconds for them,
+        forever if block is 0.
+        """
+        if last_msg_id in (b'$', '$'):
+            stream = self._lookup(stream_key, _Stream)
+            last_id = stream.last_id if stream is not None else (0, 0)
+        else:
+            last_id = _parse_id(str(last_msg_id) if isinstance(last_msg_id, int) else last_msg_id, 0)
+
+        messages = self._read_after(stream_key, last_id, count)
+        if not messages and block is not None:
+            reader = asyncio.get_running_loop().create_future()
+            self._readers.setdefault(stream_key, set()).add(reader)
+            try:
+                await asyncio.wait_for(reader, block / 1000 if block else None)
+            except asyncio.TimeoutError:
+                return []
+            finally:
+                readers = self._readers.get(stream_key)
+                if readers is not None:
+                    readers.discard(reader)
+                    if not readers:
+                        del self._readers[stream_key]
+            messages = self._read_after(stream_key, last_id, count)
+        return [[stream_key.encode(), messages]] if messages else []
+
+    async def read_range(
+            self,
+            stream_key: str,
+            min_id: Union[bytes, str] = '-',
+            max_id: Union[bytes, str] = '+',
+            count: Optional[int] = None,
+    ) -> Any:
+        stream = self._lookup(stream_key, _Stream)
+        if stream is None:
+            return []
+        if isinstance(min_id, bytes):
+            min_id = min_id.decode()
+        if isinstance(max_id, bytes):
+            max_id = max_id.decode()
+
+        if min_id == '-':
+            start = 0
+        elif min_id.startswith('('):
+            start = bisect_right(stream.ids, _parse_id(min_id[1:], 0))
+        else:
+            start = bisect_left(stream.ids, _parse_id(min_id, 0))
+        if max_id == '+':
+            end = len(stream.ids)
+        elif max_id.startswith('('):
+            end = bisect_left(stream.ids, _parse_id(max_id[1:], 0))
+        else:
+            end = bisect_right(stream.ids, _parse_id(max_id, sys.maxsize))
+        return stream.range(start, end, count) if start < end else []
+
+    async def send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> Any:
+        return self._send(stream_key, fields, min_id)
+
+    async def set_add(self, key: str, value: str) -> int:
+        return self._set_add(key, value)
+
+    async def read_set(self, key: str) -> Any:
+        members = self._lookup(key, set)
+        return set() if members is None else set(members)
+
+    async def value_in_set(self, key: str, value: str) -> Any:
+        return self._value_in_set(key, value)
+
+    async def delete_set_value(self, key: str, value: str) -> int:
+        return self._delete_set_value(key, value)
+
+    def stats(self) -> dict:
+        self._expire()
+        return {
+            'keys': len(self._data),
+            'expiring_keys': len(self.wheel),
+            'expired': self.expired,
+            'memory': self.memory,
+        }
@@ -0,0 +1,245 @@
+__all__ = (
+    'NearCache',
+)
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Hashable, Iterable, Optional
+
+from redis import asyncio as aioredis
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import ConnectionError
+
+from app.cache.memory import TTLCache
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class NearCache:
+    """Process local copy of redis keys kept consistent by server assisted client side caching.
+
+    A tracking connection turns ``CLIENT TRACKING`` on in broadcasting mode for
+    ``prefixes`` and redirects invalidation messages to a listener connection
+    subscribed to ``__redis__:invalidate``, so every write to a key with one of
+    the prefixes drops its local copy. Results of commands are cached per key,
+    a read racing with invalidation of its key is not cached. Entries expire
+    after ``ttl`` seconds and never outlive the redis key.
+
+    If either connection breaks, invalidations could be lost, so the whole
+    local copy is dropped and nothing is cached until tracking is restored.
+    """
+    CHANNEL = '__redis__:invalidate'
+    HEALTH_CHECK_INTERVAL = 1.0
+
+    def __init__(
+            self,
+            redis: Redis,
+            url: str,
+            prefixes: Optional[Iterable[str]] = None,
+            max_size: Optional[int] = None,
+            ttl: Optional[float] = None,
+    ) -> None:
+        self.redis = redis
+        self.url = url
+        self.prefixes = tuple(settings.REDIS_NEAR_CACHE_PREFIXES if prefixes is None else prefixes)
+        self.local = TTLCache(
+            max_size=settings.REDIS_NEAR_CACHE_SIZE if max_size is None else max_size,
+            ttl=ttl or settings.REDIS_NEAR_CACHE_TTL,
+        )
+        self.name = f'near-cache-{uuid.uuid4().hex}'
+        self.enabled = False
+        self._listener: Optional[Redis] = None
+        self._tracker: Optional[Redis] = None
+        self._pubsub: Optional[PubSub] = None
+        self._task: Optional[asyncio.Task] = None
+        # key -> number of reads in flight, keys invalidated while being read
+        self._loading: dict[str, int] = {}
+        self._stale: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.resets = 0
+
+    def _client(self, **kwargs) -> Redis:
+        return aioredis.from_url(self.url, single_connection_client=True, **kwargs)
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def start(self) -> None:
+        """Starts tracking in background, reads are not cached until it is established."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._track()
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa
+                logger.exception('Near cache lost redis invalidations, local copy is dropped')
+            await self._disconnect()
+            self.resets += 1
+            await asyncio.sleep(self.HEALTH_CHECK_INTERVAL)
+
+    async def _track(self) -> None:
+        # listener is found by name, its id changes if connection is reestablished. It speaks
+        # RESP2, so redirected invalidations are delivered as messages of the channel
+        self._listener = self._client(client_name=self.name, protocol=2)
+        self._tracker = self._client()
+        self._pubsub = self._listener.pubsub()
+        await self._pubsub.subscribe(self.CHANNEL)
+        listener_id = next(
+            int(client['id']) for client in await self._tracker.client_list(_type='pubsub')
+            if client.get('name') == self.name
+        )
+        await self._tracker.client_tracking_on(clientid=listener_id, bcast=True, prefix=list(self.prefixes))
+        self.enabled = True
+        logger.info('Near cache tracks keys [%s]', ', '.join(self.prefixes))
+
+    async def _tracking_flags(self) -> set[str]:
+        info = await self._tracker.execute_command('CLIENT', 'TRACKINGINFO')
+        if isinstance(info, list):
+            info = dict(zip(info[::2], info[1::2]))
+        flags = info.get(b'flags', info.get('flags', []))
+        return {flag.decode() if isinstance(flag, bytes) else flag for flag in flags}
+
+    async def _listen(self) -> None:
+        checked_at = time.monotonic()
+        while True:
+            message = await self._pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=self.HEALTH_CHECK_INTERVAL,
+            )
+            if message is not None:
+                self._on_invalidate(message['data'])
+            if time.monotonic() - checked_at >= self.HEALTH_CHECK_INTERVAL:
+                # tracking is silently turned off if tracking connection is reestablished
+                flags = await self._tracking_flags()
+                if 'on' not in flags or 'broken_redirect' in flags:
+                    raise ConnectionError(f'Client tracking is broken: {", ".join(sorted(flags))}')
+                checked_at = time.monotonic()
+
+    async def _disconnect(self) -> None:
+        self.enabled = False
+        self.clear()
+        for client in (self._pubsub, self._listener, self._tracker):
+            if client is not None:
+                try:
+                    await client.close()
+                    if isinstance(client, Redis):
+                        await client.connection_pool.disconnect()
+                except Exception:  # noqa
+                    pass
+        self._pubsub = self._listener = self._tracker = None
+
+    def _on_invalidate(self, keys: Optional[list]) -> None:
+        self.invalidations += 1
+        if keys is None:
+            # whole database was flushed
+            self.clear()
+            return None
+        for key in keys:
+            self.invalidate(key.decode() if isinstance(key, bytes) else key)
+        return None
+
+    def invalidate(self, key: str) -> None:
+        """Drops local copy of key, called by the storage after its own writes too."""
+        self.local.delete(key)
+        if key in self._loading:
+            self._stale.add(key)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._stale.update(self._loading)
+
+    def lookup(self, key: str, field: Hashable) -> Any:
+        """Returns cached result of command or ``MISSING``."""
+        if self.enabled and self.tracks(key):
+            entry = self.local.get(key)
+            if entry is not None and field in entry:
+                self.hits += 1
+                return entry[field]
+            self.misses += 1
+        return MISSING
+
+    async def load(self, commands: list[tuple[str, Hashable, str, tuple]]) -> list:
+        """Executes ``(key, field, command, args)`` commands in one round trip, caching results of tracked keys."""
+        self.start()
+        for key, *_ in commands:
+            self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            async with self.redis.pipeline(transaction=False) as pipeline:
+                for key, _, command, args in commands:
+                    getattr(pipeline, command)(key, *args).pttl(key)
+                results = await pipeline.execute()
+        finally:
+            stale = set()
+            for key, *_ in commands:
+                if key in self._stale:
+                    stale.add(key)
+                count = self._loading.pop(key) - 1
+                if count:
+                    self._loading[key] = count
+                else:
+                    self._stale.discard(key)
+
+        values = results[::2]
+        if self.enabled:
+            for (key, field, _, _), value, pttl in zip(commands, values, results[1::2]):
+                if self.tracks(key) and key not in stale:
+                    self._store(key, field, value, pttl)
+        return values
+
+    def _store(self, key: str, field: Hashable, value: Any, pttl: int) -> None:
+        entry = self.local.get(key) or {}
+        entry[field] = value
+        # negative pttl is returned for persistent and missing keys
+        ttl = min(pttl / 1000, self.local.ttl) if pttl > 0 else None
+        self.local.set(key, entry, ttl=ttl)
+
+    async def get(self, key: str, field: Hashable, command: str, *args) -> Any:
+        value = self.lookup(key, field)
+        if value is MISSING:
+            value, = await self.load([(key, field, command, args)])
+        return value
+
+    async def get_many(self, keys: list[str]) -> list:
+        values = [self.lookup(key, 'get') for key in keys]
+        missing = [index for index, value in enumerate(values) if value is MISSING]
+        if missing:
+            loaded = await self.load([(keys[index], 'get', 'get', ()) for index in missing])
+            for index, value in zip(missing, loaded):
+                values[index] = value
+        return values
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': self.local.stats()['size'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'invalidations': self.invalidations,
+            'resets': self.resets,
+        }
@@ -0,0 +1,103 @@
+__all__ = (
+    'get_pwd_context',
+    'password_hasher',
+    'PasswordHasher',
+)
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.core.errors import PasswordHasherError
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(None)
+def get_pwd_context() -> Any:
+    """Returns bcrypt context, passlib is imported on first use."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash_password(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification in a dedicated process pool.
+
+    At most ``pool_size`` calls run at once and at most ``queue_size`` more wait
+    for a free worker; any further call is rejected instead of piling up.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, queue_size: Optional[int] = None) -> None:
+        self.pool_size = pool_size or settings.PASSWORD_HASHER_POOL_SIZE
+        self.queue_size = settings.PASSWORD_HASHER_QUEUE_SIZE if queue_size is None else queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.calls = 0
+        self.total_time = 0.0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self._pending >= self.pool_size + self.queue_size:
+            raise PasswordHasherError(
+                'Password hasher is overloaded!',
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+        self._pending += 1
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+            elapsed = time.perf_counter() - started_at
+            self.calls += 1
+            self.total_time += elapsed
+            logger.debug('Password hasher %s took %.3fs', func.__name__, elapsed)
+
+    async def hash(self, password: str) -> str:
+        """Gets hash for plain password."""
+        return await self._run(_hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verifies password with stored hash."""
+        return await self._run(_verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            'pool_size': self.pool_size,
+            'queue_size': self.queue_size,
+            'pending': self._pending,
+            'calls': self.calls,
+            'avg_time': self.total_time / self.calls if self.calls else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,44 @@
+__all__ = (
+    'KeyedPermutation',
+)
+
+import hashlib
+
+
+class KeyedPermutation:
+    """Pseudorandom permutation of integers in ``[0, size)`` defined by a secret key.
+
+    Balanced Feistel network over the smallest even number of bits covering
+    ``size``, values outside of the range are cycle walked back into it. Without
+    the key consecutive indexes give unpredictable, never repeating values.
+    """
+    ROUNDS = 4
+
+    def __init__(self, size: int, key: bytes) -> None:
+        self.size = size
+        self.key = key
+        self.half_bits = max((size - 1).bit_length() + 1, 2) // 2
+        self._half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, round_number: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, 'little'),
+            key=self.key,
+            person=round_number.to_bytes(16, 'little'),
+            digest_size=8,
+        ).digest()
+        return int.from_bytes(digest, 'little') & self._half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self._half_mask
+        for round_number in range(self.ROUNDS):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
@@ -0,0 +1,96 @@
+__all__ = (
+    'RateLimit',
+    'TokenBucketLimiter',
+)
+
+import logging
+import time
+from dataclasses import dataclass
+
+from app.cache.memory import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket of ``count`` tokens refilled in ``period`` seconds."""
+    count: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> 'RateLimit':
+        """Parses limit written as ``count/seconds``, e.g. ``10/60``."""
+        count, period = value.split('/')
+        return cls(count=int(count), period=float(period))
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.period
+
+
+class TokenBucketLimiter:
+    """Token bucket rate limiter shared through the storage.
+
+    Buckets of one request are checked and taken in one scripted round trip.
+    Every process also keeps the last known state of recently used buckets,
+    refilled locally at the same rate. Since a process never sees more tokens
+    than there are in the storage, requests it finds no tokens for are refused
+    without a storage call.
+    """
+    KEY_PREFIX = 'rate-limit-'
+
+    def __init__(self, storage, local_size: int = 10000) -> None:
+        self.storage = storage
+        # bucket key -> [tokens, monotonic time of tokens value]
+        self.local = TTLCache(max_size=local_size, ttl=0)
+        self.local_rejects = 0
+        self.rejects = 0
+
+    def _local_retry_after(self, key: str, limit: RateLimit, cost: float, now: float) -> float:
+        bucket = self.local.get(key)
+        if bucket is None:
+            return 0
+        tokens = min(limit.count, bucket[0] + (now - bucket[1]) * limit.rate)
+        return max(cost - tokens, 0) / limit.rate
+
+    async def take(self, buckets: list[tuple[str, RateLimit]], cost: float = 1) -> float:
+        """Takes tokens from all buckets. Returns 0 if request is allowed, otherwise seconds
+        after which it may be retried.
+        """
+        if not buckets:
+            return 0
+        now = time.monotonic()
+        keys = [f'{self.KEY_PREFIX}{key}' for key, _ in buckets]
+        retry_after = max(
+            self._local_retry_after(key, limit, cost, now)
+            for key, (_, limit) in zip(keys, buckets)
+        )
+        if retry_after:
+            self.local_rejects += 1
+            return retry_after
+
+        try:
+            taken, tokens = await self.storage.take_tokens(
+                buckets=[(key, limit.rate, limit.count) for key, (_, limit) in zip(keys, buckets)],
+                cost=cost,
+            )
+        except Exception:  # noqa
+            # limiter must not take the service down together with the storage
+            logger.exception('Rate limit storage is unavailable, request is allowed')
+            return 0
+
+        for key, (_, limit), value in zip(keys, buckets, tokens):
+            self.local.set(key, [value, now], ttl=limit.period)
+        if taken:
+            return 0
+        self.rejects += 1
+        return max(max(cost - value, 0) / limit.rate for (_, limit), value in zip(buckets, tokens))
+
+    def stats(self) -> dict:
+        return {
+            'local_buckets': self.local.stats()['size'],
+            'local_rejects': self.local_rejects,
+            'rejects': self.rejects,
+        }
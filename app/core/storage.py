@@ -1,9 +1,94 @@
-__all__ = ('CacheStorage', 'RedisStorage')
+__all__ = ('CacheStorage', 'RedisStorage', 'RedisBatch', 'ShardedRedisStorage', 'ShardedRedisBatch', 'create_storage')
 
 import abc
+import asyncio
+import time
+from collections import defaultdict
 from typing import Any, Union, Optional
 
+from redis import asyncio as aioredis
 from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.core.hash_ring import HashRing
+from app.core.near_cache import NearCache
+
+# Expiring set is a sorted set of members scored by their expiration timestamp.
+# Prunes expired members, adds member ARGV[2] expiring at ARGV[3] and moves key
+# expiration to the newest member. ARGV[1] is current timestamp.
+_EXPIRING_SET_ADD = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+redis.call('EXPIREAT', KEYS[1], newest[2])
+"""
+
+EXPIRING_SET_ADD_SCRIPT = _EXPIRING_SET_ADD + """
+return 1
+"""
+
+# Replaces unexpired expiring set member ARGV[4] with ARGV[2] expiring at ARGV[3].
+# Returns 1 when member was replaced, 0 otherwise.
+REPLACE_EXPIRING_SET_VALUE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[4])
+if not score or tonumber(score) <= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[4])
+""" + _EXPIRING_SET_ADD + """
+return 1
+"""
+
+# Deletes KEYS[1] only if its value is ARGV[1]. Returns 1 when key was deleted, 0 otherwise.
+DELETE_IF_EQUAL_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# Moves up to ARGV[2] members of sorted set KEYS[1] with score up to ARGV[1] to stream KEYS[2],
+# each as a message with single field ARGV[3]. Returns number of moved members.
+SEND_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('XADD', KEYS[2], '*', ARGV[3], member)
+    redis.call('ZREM', KEYS[1], member)
+end
+return #due
+"""
+
+
+# Token buckets are KEYS, ARGV[1] is the number of tokens to take, ARGV[2 * i] and ARGV[2 * i + 1]
+# are refill rate per second and capacity of i-th bucket. Tokens are taken only if every bucket
+# has enough of them. Returns 1 if taken or 0, then tokens left in each bucket multiplied by 1000.
+TAKE_TOKENS_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local cost = tonumber(ARGV[1])
+-- taken flag, then refilled tokens of each bucket
+local result = {1}
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local value = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    result[i + 1] = math.min(capacity, value + math.max(0, now - ts) * rate)
+    if result[i + 1] < cost then
+        result[1] = 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, capacity = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local tokens = result[i + 1] - cost * result[1]
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+    result[i + 1] = math.floor(tokens * 1000)
+end
+return result
+"""
 
 
 class CacheStorage(abc.ABC):
@@ -37,10 +122,131 @@ class CacheStorage(abc.ABC):
             Any: [description]
         """
 
+    async def close(self) -> None:
+        return None
+
+    def stats(self) -> Optional[dict]:
+        """Returns usage of storage kept in process memory, None if storage is remote."""
+        return None
+
+    def near_cache_stats(self) -> Optional[dict]:
+        return None
+
+
+class RedisBatch:
+    """Queues storage commands and sends them to redis in one round trip.
+
+    Methods mirror ``RedisStorage`` ones, results are returned by ``execute``
+    in the order commands were added.
+    """
+
+    def __init__(self, redis: Redis, transaction: bool = True, near_cache: Optional[NearCache] = None) -> None:
+        self.pipeline = redis.pipeline(transaction=transaction)
+        self.near_cache = near_cache
+        self._written_keys: list[str] = []
+
+    def delete(self, *, key: str) -> 'RedisBatch':
+        self.pipeline.delete(key)
+        self._written_keys.append(key)
+        return self
+
+    def set(self, *, key: str, value: Union[str, int] = 0, exp: int, nx: bool = False) -> 'RedisBatch':
+        self.pipeline.set(key, value, ex=exp, nx=nx)
+        self._written_keys.append(key)
+        return self
+
+    def get(self, *, key: str) -> 'RedisBatch':
+        self.pipeline.get(key)
+        return self
+
+    def set_add(self, key: str, value: str) -> 'RedisBatch':
+        self.pipeline.sadd(key, value)
+        self._written_keys.append(key)
+        return self
+
+    def value_in_set(self, key: str, value: str) -> 'RedisBatch':
+        self.pipeline.sismember(key, value)
+        return self
+
+    def delete_set_value(self, key: str, value: str) -> 'RedisBatch':
+        self.pipeline.srem(key, value)
+        self._written_keys.append(key)
+        return self
+
+    def send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> 'RedisBatch':
+        self.pipeline.xadd(stream_key, fields=fields, minid=min_id)
+        return self
+
+    def ack(self, stream_key: str, group: str, *message_ids: Union[bytes, str]) -> 'RedisBatch':
+        self.pipeline.xack(stream_key, group, *message_ids)
+        return self
+
+    def delete_messages(self, stream_key: str, *message_ids: Union[bytes, str]) -> 'RedisBatch':
+        self.pipeline.xdel(stream_key, *message_ids)
+        return self
+
+    def schedule(self, key: str, value: Union[bytes, str], due_at: float) -> 'RedisBatch':
+        self.pipeline.zadd(key, {value: due_at})
+        return self
+
+    async def execute(self) -> list:
+        """Sends queued commands, wrapped in MULTI/EXEC for transactional batch.
+
+        Returns:
+            list: [results of queued commands]
+        """
+        try:
+            async with self.pipeline as pipeline:
+                return await pipeline.execute()
+        finally:
+            if self.near_cache is not None:
+                for key in self._written_keys:
+                    self.near_cache.invalidate(key)
+
 
 class RedisStorage(CacheStorage):
-    def __init__(self, redis: Redis) -> None:
+    """Redis storage. Reads of keys tracked by optional ``near_cache`` are served from
+    process memory until redis invalidates them.
+    """
+
+    def __init__(self, redis: Redis, near_cache: Optional[NearCache] = None) -> None:
         self.redis = redis
+        self.near_cache = near_cache
+        self._expiring_set_add = redis.register_script(EXPIRING_SET_ADD_SCRIPT)
+        self._replace_expiring_set_value = redis.register_script(REPLACE_EXPIRING_SET_VALUE_SCRIPT)
+        self._delete_if_equal = redis.register_script(DELETE_IF_EQUAL_SCRIPT)
+        self._send_due = redis.register_script(SEND_DUE_SCRIPT)
+        self._take_tokens = redis.register_script(TAKE_TOKENS_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, near_cache: bool = False) -> 'RedisStorage':
+        redis = aioredis.from_url(url)
+        return cls(redis, near_cache=NearCache(redis, url) if near_cache else None)
+
+    async def close(self) -> None:
+        if self.near_cache is not None:
+            await self.near_cache.close()
+        await self.redis.close()
+
+    def _tracked(self, key: str) -> bool:
+        return self.near_cache is not None and self.near_cache.tracks(key)
+
+    def _invalidate(self, key: str) -> None:
+        if self.near_cache is not None:
+            self.near_cache.invalidate(key)
+
+    def near_cache_stats(self) -> Optional[dict]:
+        return None if self.near_cache is None else self.near_cache.stats()
+
+    def batch(self, transaction: bool = True) -> RedisBatch:
+        """Returns batch to send several commands in one round trip.
+
+        Args:
+            transaction (bool): [execute commands atomically]
+        Returns:
+            RedisBatch: [commands batch]
+        """
+        return RedisBatch(self.redis, transaction=transaction, near_cache=self.near_cache)
 
     async def delete(self, *, key: str) -> Any:
         """Deletes entry from redis by key.
@@ -48,7 +254,10 @@ class RedisStorage(CacheStorage):
         Args:
             key (str): [description]
         """
-        return await self.redis.delete(key)
+        try:
+            return await self.redis.delete(key)
+        finally:
+            self._invalidate(key)
 
     async def set(self, *, key: str, value: Union[str, int] = 0, exp: int) -> Any:
         """Sets data to storage.
@@ -59,7 +268,10 @@ class RedisStorage(CacheStorage):
                 (default value is 0 NOTE: https://stackoverflow.com/a/59292672/2793303)
             exp (int): expiration
         """
-        return await self.redis.set(key, value, ex=exp)
+        try:
+            return await self.redis.set(key, value, ex=exp)
+        finally:
+            self._invalidate(key)
 
     async def get(self, *, key: str) -> Any:
         """Gets value by key from redis.
@@ -69,9 +281,188 @@ class RedisStorage(CacheStorage):
         Returns:
             Any: [description]
         """
-
+        if self._tracked(key):
+            return await self.near_cache.get(key, 'get', 'get')
         return await self.redis.get(key)
 
+    async def set_default(self, *, key: str, value: Union[str, bytes]) -> Any:
+        """Sets persistent value only if key does not exist.
+
+        Args:
+            key (str): [description]
+            value (str | bytes): [value to set]
+        Returns:
+            Any: [value stored in key]
+        """
+        try:
+            stored_value = await self.redis.set(key, value, nx=True, get=True)
+        finally:
+            self._invalidate(key)
+        return value if stored_value is None else stored_value
+
+    async def increment(self, *, key: str, amount: int = 1) -> int:
+        """Atomically increments persistent counter.
+
+        Args:
+            key (str): [description]
+            amount (int): [increment]
+        Returns:
+            int: [counter value after increment]
+        """
+        try:
+            return await self.redis.incrby(key, amount)
+        finally:
+            self._invalidate(key)
+
+    async def delete_if_equal(self, *, key: str, value: Union[str, int]) -> bool:
+        """Atomically deletes key only if it holds value.
+
+        Args:
+            key (str): [description]
+            value (str | int): [expected value]
+        Returns:
+            bool: [key was deleted]
+        """
+        try:
+            return bool(await self._delete_if_equal(keys=[key], args=[value]))
+        finally:
+            self._invalidate(key)
+
+    async def take_tokens(self, buckets: list[tuple[str, float, float]], cost: float = 1) -> tuple[bool, list[float]]:
+        """Atomically takes tokens from every token bucket, only if all of them have enough tokens.
+        Buckets are refilled by redis time.
+
+        Args:
+            buckets (list[tuple[str, float, float]]): [bucket key, refill rate per second, capacity]
+            cost (float): [tokens to take from each bucket]
+        Returns:
+            tuple[bool, list[float]]: [tokens were taken, tokens left in buckets]
+        """
+        args = [cost]
+        for _, rate, capacity in buckets:
+            args.extend((rate, capacity))
+        taken, *tokens = await self._take_tokens(keys=[key for key, _, _ in buckets], args=args)
+        return bool(taken), [value / 1000 for value in tokens]
+
+    async def get_many(self, *, keys: list[str]) -> list:
+        """Gets values of several keys from redis in one round trip.
+
+        Args:
+            keys (list[str]): [keys]
+        Returns:
+            list: [values in keys order, None for missing keys]
+        """
+        if self.near_cache is not None and any(map(self.near_cache.tracks, keys)):
+            return await self.near_cache.get_many(keys)
+        return await self.redis.mget(keys)
+
+    async def expiring_set_add(self, key: str, value: str, expire_at: int) -> int:
+        """Adds value expiring at expire_at to an expiring set, prunes expired values.
+        Set itself expires together with its newest value.
+
+        Args:
+           key (str): [name of set]
+           value (str): [value to add to set]
+           expire_at (int): [value expiration timestamp]
+        Returns:
+           int: [1]
+        """
+        try:
+            return await self._expiring_set_add(keys=[key], args=[int(time.time()), value, expire_at])
+        finally:
+            self._invalidate(key)
+
+    async def value_in_expiring_set(self, key: str, value: str) -> bool:
+        """Returns a boolean indicating if ``value`` is an unexpired member of expiring set ``key``
+
+        Args:
+           key (str): [name of set]
+           value (str): [value in set]
+        Returns:
+           bool: [is value exists]
+        """
+        if self._tracked(key):
+            expire_at = await self.near_cache.get(key, ('zscore', value), 'zscore', value)
+        else:
+            expire_at = await self.redis.zscore(key, value)
+        return expire_at is not None and expire_at > time.time()
+
+    async def delete_expiring_set_value(self, key: str, value: str) -> int:
+        """Removes value from expiring set
+
+        Args:
+           key (str): [name of set]
+           value (str): [value to remove from set]
+        Returns:
+           int: [number of removed values]
+        """
+        try:
+            return await self.redis.zrem(key, value)
+        finally:
+            self._invalidate(key)
+
+    async def replace_expiring_set_value(self, key: str, value: str, new_value: str, expire_at: int) -> bool:
+        """Atomically removes unexpired value from expiring set and adds new_value expiring at expire_at,
+        only if value was a member.
+
+        Args:
+           key (str): [name of set]
+           value (str): [value to consume]
+           new_value (str): [value to register instead]
+           expire_at (int): [new_value expiration timestamp]
+        Returns:
+           bool: [value was replaced]
+        """
+        try:
+            return bool(await self._replace_expiring_set_value(
+                keys=[key],
+                args=[int(time.time()), new_value, expire_at, value],
+            ))
+        finally:
+            self._invalidate(key)
+
+    async def prune_expiring_sets(self, match: str, count: int = 500) -> int:
+        """Removes expired values from all expiring sets matching pattern.
+        Keys are iterated with SCAN, each batch of keys is pruned in one round trip.
+
+        Args:
+           match (str): [keys pattern]
+           count (int): [keys batch size]
+        Returns:
+           int: [number of removed values]
+        """
+        removed = 0
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(cursor=cursor, match=match, count=count, _type='zset')
+            if keys:
+                now = time.time()
+                async with self.redis.pipeline(transaction=False) as pipeline:
+                    for key in keys:
+                        pipeline.zremrangebyscore(key, '-inf', now)
+                    removed += sum(await pipeline.execute())
+            if not cursor:
+                return removed
+
+    async def delete_keys(self, match: str, key_type: Optional[str] = None, count: int = 500) -> int:
+        """Deletes all keys matching pattern, iterating them with SCAN in batches.
+
+        Args:
+           match (str): [keys pattern]
+           key_type (Optional[str]): [delete only keys of this type]
+           count (int): [keys batch size]
+        Returns:
+           int: [number of deleted keys]
+        """
+        deleted = 0
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(cursor=cursor, match=match, count=count, _type=key_type)
+            if keys:
+                deleted += await self.redis.unlink(*keys)
+            if not cursor:
+                return deleted
+
     async def read(
             self,
             stream_key: str,
@@ -95,20 +486,130 @@ class RedisStorage(CacheStorage):
             block=block,
         )
 
+    async def read_range(
+            self,
+            stream_key: str,
+            min_id: Union[bytes, str] = '-',
+            max_id: Union[bytes, str] = '+',
+            count: Optional[int] = None,
+    ) -> Any:
+        """Reads messages with ids in range from stream with name stream_key
+
+        Args:
+            stream_key (str): [name of redis stream]
+            min_id (str): [first message id]
+            max_id (str): [last message id]
+            count (Optional[int]): [count of messages]
+        Returns:
+            Any: [list of (message id, fields)]
+        """
+        return await self.redis.xrange(stream_key, min=min_id, max=max_id, count=count)
+
     async def send(
             self,
             stream_key: str,
             fields: dict,
+            min_id: Optional[str] = None,
     ) -> Any:
         """Sends message to a stream with name stream_key
 
         Args:
             stream_key (str): [name of redis stream]
             fields (dict): [data to send]
+            min_id (Optional[str]): [trim messages with lower ids, approximately]
         Returns:
             Any: [description]
         """
-        return await self.redis.xadd(stream_key, fields=fields)
+        return await self.redis.xadd(stream_key, fields=fields, minid=min_id)
+
+    async def create_group(self, stream_key: str, group: str) -> bool:
+        """Creates consumer group reading stream from the beginning, creates stream if needed.
+
+        Args:
+            stream_key (str): [name of redis stream]
+            group (str): [name of consumer group]
+        Returns:
+            bool: [group was created, False if it already existed]
+        """
+        try:
+            await self.redis.xgroup_create(stream_key, group, id='0', mkstream=True)
+        except ResponseError as exc:
+            if not str(exc).startswith('BUSYGROUP'):
+                raise
+            return False
+        return True
+
+    async def read_group(
+            self,
+            stream_key: str,
+            group: str,
+            consumer: str,
+            count: Optional[int] = None,
+            block: Optional[int] = None,
+    ) -> Any:
+        """Reads messages never delivered to consumer group
+
+        Args:
+            stream_key (str): [name of redis stream]
+            group (str): [name of consumer group]
+            consumer (str): [name of consumer in group]
+            count (Optional[int]): [count of messages]
+            block (Optional[int]): [milliseconds to wait for messages]
+        Returns:
+            Any: [list of (stream, list of (message id, fields))]
+        """
+        return await self.redis.xreadgroup(group, consumer, streams={stream_key: '>'}, count=count, block=block)
+
+    async def claim_idle(
+            self,
+            stream_key: str,
+            group: str,
+            consumer: str,
+            min_idle_time: int,
+            count: int = 100,
+            start_id: Union[bytes, str] = '0-0',
+    ) -> Any:
+        """Takes over messages delivered to other consumers of group and not acknowledged for
+        min_idle_time milliseconds
+
+        Args:
+            stream_key (str): [name of redis stream]
+            group (str): [name of consumer group]
+            consumer (str): [name of new owner]
+            min_idle_time (int): [milliseconds since last delivery]
+            count (int): [count of messages]
+            start_id (str): [id to start scan from]
+        Returns:
+            Any: [next start id, list of (message id, fields), deleted message ids]
+        """
+        return await self.redis.xautoclaim(
+            stream_key, group, consumer, min_idle_time, start_id=start_id, count=count,
+        )
+
+    async def ack(self, stream_key: str, group: str, *message_ids: Union[bytes, str]) -> int:
+        """Acknowledges messages processed by consumer group
+
+        Args:
+            stream_key (str): [name of redis stream]
+            group (str): [name of consumer group]
+            message_ids (str): [processed message ids]
+        Returns:
+            int: [number of acknowledged messages]
+        """
+        return await self.redis.xack(stream_key, group, *message_ids)
+
+    async def send_due(self, key: str, stream_key: str, field: str, count: int = 100) -> int:
+        """Moves members of sorted set scored by due timestamp which are due to a stream
+
+        Args:
+            key (str): [name of sorted set]
+            stream_key (str): [name of redis stream]
+            field (str): [message field to put member to]
+            count (int): [max count of moved members]
+        Returns:
+            int: [number of moved members]
+        """
+        return await self._send_due(keys=[key, stream_key], args=[time.time(), count, field])
 
     async def set_add(self, key: str, value: str) -> int:
         """Adds value to a set
@@ -119,7 +620,10 @@ class RedisStorage(CacheStorage):
         Returns:
            bool: [add or not add value to set]
         """
-        return await self.redis.sadd(key, value)
+        try:
+            return await self.redis.sadd(key, value)
+        finally:
+            self._invalidate(key)
 
     async def read_set(self, key: str) -> Any:
         """Gets all the members of the set value stored at key.
@@ -140,6 +644,8 @@ class RedisStorage(CacheStorage):
         Returns:
            bool: [is value exists]
         """
+        if self._tracked(key):
+            return await self.near_cache.get(key, ('sismember', value), 'sismember', value)
         return await self.redis.sismember(key, value)
 
     async def delete_set_value(self, key: str, value: str) -> int:
@@ -151,4 +657,262 @@ class RedisStorage(CacheStorage):
         Returns:
            bool: [remove or not remove value from set]
         """
-        return await self.redis.srem(key, value)
+        try:
+            return await self.redis.srem(key, value)
+        finally:
+            self._invalidate(key)
+
+
+class ShardedRedisBatch:
+    """``RedisBatch`` over several shards, one pipeline per shard sent concurrently.
+
+    Commands of one shard are atomic for transactional batch, commands of
+    different shards are not. Results are returned in the order commands were
+    added.
+    """
+
+    def __init__(self, storage: 'ShardedRedisStorage', transaction: bool = True) -> None:
+        self.storage = storage
+        self.transaction = transaction
+        self._batches: dict[str, RedisBatch] = {}
+        self._order: list[tuple[str, int]] = []
+        self._sizes: dict[str, int] = defaultdict(int)
+
+    def _add(self, route_key: str, command: str, *args, **kwargs) -> 'ShardedRedisBatch':
+        shard = self.storage.ring.get_node(route_key)
+        batch = self._batches.get(shard)
+        if batch is None:
+            batch = self._batches[shard] = self.storage.shards[shard].batch(transaction=self.transaction)
+        getattr(batch, command)(*args, **kwargs)
+        self._order.append((shard, self._sizes[shard]))
+        self._sizes[shard] += 1
+        return self
+
+    def delete(self, *, key: str) -> 'ShardedRedisBatch':
+        return self._add(key, 'delete', key=key)
+
+    def set(self, *, key: str, value: Union[str, int] = 0, exp: int, nx: bool = False) -> 'ShardedRedisBatch':
+        return self._add(key, 'set', key=key, value=value, exp=exp, nx=nx)
+
+    def get(self, *, key: str) -> 'ShardedRedisBatch':
+        return self._add(key, 'get', key=key)
+
+    def set_add(self, key: str, value: str) -> 'ShardedRedisBatch':
+        return self._add(key, 'set_add', key, value)
+
+    def value_in_set(self, key: str, value: str) -> 'ShardedRedisBatch':
+        return self._add(key, 'value_in_set', key, value)
+
+    def delete_set_value(self, key: str, value: str) -> 'ShardedRedisBatch':
+        return self._add(key, 'delete_set_value', key, value)
+
+    def send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> 'ShardedRedisBatch':
+        return self._add(stream_key, 'send', stream_key, fields=fields, min_id=min_id)
+
+    def ack(self, stream_key: str, group: str, *message_ids: Union[bytes, str]) -> 'ShardedRedisBatch':
+        return self._add(stream_key, 'ack', stream_key, group, *message_ids)
+
+    def delete_messages(self, stream_key: str, *message_ids: Union[bytes, str]) -> 'ShardedRedisBatch':
+        return self._add(stream_key, 'delete_messages', stream_key, *message_ids)
+
+    def schedule(self, key: str, value: Union[bytes, str], due_at: float) -> 'ShardedRedisBatch':
+        return self._add(key, 'schedule', key, value, due_at=due_at)
+
+    async def execute(self) -> list:
+        shards = list(self._batches)
+        results = dict(zip(shards, await asyncio.gather(*(self._batches[shard].execute() for shard in shards))))
+        return [results[shard][index] for shard, index in self._order]
+
+
+class ShardedRedisStorage(CacheStorage):
+    """Storage sharding keys over several redis instances by consistent hash ring.
+
+    Every process routes a key to the same shard, and adding a shard moves only
+    about 1/N of keys. Routing has no per call state, so it is safe for
+    concurrent coroutines. Keys sharing a ``{hash tag}`` are kept on one
+    shard, multi key scripts must only be called for such keys.
+    """
+
+    def __init__(self, shards: dict[str, RedisStorage], vnodes: int = 160) -> None:
+        self.shards = shards
+        self.ring = HashRing(shards, vnodes=vnodes)
+
+    @classmethod
+    def from_urls(cls, urls: list[str], vnodes: int = 160, near_cache: bool = False) -> 'ShardedRedisStorage':
+        return cls({url: RedisStorage.from_url(url, near_cache=near_cache) for url in urls}, vnodes=vnodes)
+
+    def add_shard(self, name: str, storage: RedisStorage) -> None:
+        self.shards[name] = storage
+        self.ring.add_node(name)
+
+    def get_shard(self, key: str) -> RedisStorage:
+        return self.shards[self.ring.get_node(key)]
+
+    async def close(self) -> None:
+        await asyncio.gather(*(shard.close() for shard in self.shards.values()))
+
+    def near_cache_stats(self) -> Optional[dict]:
+        stats = {name: shard.near_cache_stats() for name, shard in self.shards.items()}
+        return stats if any(stats.values()) else None
+
+    def batch(self, transaction: bool = True) -> ShardedRedisBatch:
+        return ShardedRedisBatch(self, transaction=transaction)
+
+    async def delete(self, *, key: str) -> Any:
+        return await self.get_shard(key).delete(key=key)
+
+    async def set(self, *, key: str, value: Union[str, int] = 0, exp: int) -> Any:
+        return await self.get_shard(key).set(key=key, value=value, exp=exp)
+
+    async def get(self, *, key: str) -> Any:
+        return await self.get_shard(key).get(key=key)
+
+    async def set_default(self, *, key: str, value: Union[str, bytes]) -> Any:
+        return await self.get_shard(key).set_default(key=key, value=value)
+
+    async def increment(self, *, key: str, amount: int = 1) -> int:
+        return await self.get_shard(key).increment(key=key, amount=amount)
+
+    async def delete_if_equal(self, *, key: str, value: Union[str, int]) -> bool:
+        return await self.get_shard(key).delete_if_equal(key=key, value=value)
+
+    async def take_tokens(self, buckets: list[tuple[str, float, float]], cost: float = 1) -> tuple[bool, list[float]]:
+        """Takes tokens from buckets of every shard separately. Buckets of different shards are not
+        taken atomically, a refused request may spend tokens of buckets on other shards.
+        """
+        by_shard: dict[str, list[int]] = defaultdict(list)
+        for index, (key, _, _) in enumerate(buckets):
+            by_shard[self.ring.get_node(key)].append(index)
+        results = await asyncio.gather(*(
+            self.shards[shard].take_tokens(buckets=[buckets[index] for index in indexes], cost=cost)
+            for shard, indexes in by_shard.items()
+        ))
+        tokens: list[float] = [0.0] * len(buckets)
+        for indexes, (_, shard_tokens) in zip(by_shard.values(), results):
+            for index, value in zip(indexes, shard_tokens):
+                tokens[index] = value
+        return all(taken for taken, _ in results), tokens
+
+    async def get_many(self, *, keys: list[str]) -> list:
+        """Gets values of keys with one MGET per shard, shards are queried concurrently."""
+        by_shard: dict[str, list[int]] = defaultdict(list)
+        for index, key in enumerate(keys):
+            by_shard[self.ring.get_node(key)].append(index)
+        results = await asyncio.gather(*(
+            self.shards[shard].get_many(keys=[keys[index] for index in indexes])
+            for shard, indexes in by_shard.items()
+        ))
+        values: list = [None] * len(keys)
+        for indexes, shard_values in zip(by_shard.values(), results):
+            for index, value in zip(indexes, shard_values):
+                values[index] = value
+        return values
+
+    async def expiring_set_add(self, key: str, value: str, expire_at: int) -> int:
+        return await self.get_shard(key).expiring_set_add(key, value, expire_at)
+
+    async def value_in_expiring_set(self, key: str, value: str) -> bool:
+        return await self.get_shard(key).value_in_expiring_set(key, value)
+
+    async def delete_expiring_set_value(self, key: str, value: str) -> int:
+        return await self.get_shard(key).delete_expiring_set_value(key, value)
+
+    async def replace_expiring_set_value(self, key: str, value: str, new_value: str, expire_at: int) -> bool:
+        return await self.get_shard(key).replace_expiring_set_value(key, value, new_value, expire_at)
+
+    async def prune_expiring_sets(self, match: str, count: int = 500) -> int:
+        return sum(await asyncio.gather(*(
+            shard.prune_expiring_sets(match, count=count) for shard in self.shards.values()
+        )))
+
+    async def delete_keys(self, match: str, key_type: Optional[str] = None, count: int = 500) -> int:
+        return sum(await asyncio.gather(*(
+            shard.delete_keys(match, key_type=key_type, count=count) for shard in self.shards.values()
+        )))
+
+    async def read(
+            self,
+            stream_key: str,
+            last_msg_id: Union[bytes, int] = b'$',
+            count: Optional[int] = None,
+            block: Optional[int] = 0,
+    ) -> Any:
+        return await self.get_shard(stream_key).read(stream_key, last_msg_id=last_msg_id, count=count, block=block)
+
+    async def read_range(
+            self,
+            stream_key: str,
+            min_id: Union[bytes, str] = '-',
+            max_id: Union[bytes, str] = '+',
+            count: Optional[int] = None,
+    ) -> Any:
+        return await self.get_shard(stream_key).read_range(stream_key, min_id=min_id, max_id=max_id, count=count)
+
+    async def send(self, stream_key: str, fields: dict, min_id: Optional[str] = None) -> Any:
+        return await self.get_shard(stream_key).send(stream_key, fields=fields, min_id=min_id)
+
+    async def create_group(self, stream_key: str, group: str) -> bool:
+        return await self.get_shard(stream_key).create_group(stream_key, group)
+
+    async def read_group(
+            self,
+            stream_key: str,
+            group: str,
+            consumer: str,
+            count: Optional[int] = None,
+            block: Optional[int] = None,
+    ) -> Any:
+        return await self.get_shard(stream_key).read_group(stream_key, group, consumer, count=count, block=block)
+
+    async def claim_idle(
+            self,
+            stream_key: str,
+            group: str,
+            consumer: str,
+            min_idle_time: int,
+            count: int = 100,
+            start_id: Union[bytes, str] = '0-0',
+    ) -> Any:
+        return await self.get_shard(stream_key).claim_idle(
+            stream_key, group, consumer, min_idle_time, count=count, start_id=start_id,
+        )
+
+    async def ack(self, stream_key: str, group: str, *message_ids: Union[bytes, str]) -> int:
+        return await self.get_shard(stream_key).ack(stream_key, group, *message_ids)
+
+    async def send_due(self, key: str, stream_key: str, field: str, count: int = 100) -> int:
+        """Sorted set and stream must share a hash tag."""
+        return await self.get_shard(key).send_due(key, stream_key, field=field, count=count)
+
+    async def set_add(self, key: str, value: str) -> int:
+        return await self.get_shard(key).set_add(key, value)
+
+    async def read_set(self, key: str) -> Any:
+        return await self.get_shard(key).read_set(key)
+
+    async def value_in_set(self, key: str, value: str) -> Any:
+        return await self.get_shard(key).value_in_set(key, value)
+
+    async def delete_set_value(self, key: str, value: str) -> int:
+        return await self.get_shard(key).delete_set_value(key, value)
+
+
+def create_storage(api: bool = False) -> CacheStorage:
+    """Creates storage from settings, sharded one if REDIS_SHARDS are set. Memory storage
+    is created only for API process, data written by other processes would never reach it.
+    Near cache is enabled for API process only, short lived task storages would only pay for
+    its tracking connections.
+    """
+    if settings.STORAGE_BACKEND == 'memory':
+        if not api:
+            raise RuntimeError('STORAGE_BACKEND=memory is kept in API process and cannot be used by other processes')
+        from app.core.memory_storage import MemoryStorage
+        return MemoryStorage()
+    near_cache = api and settings.REDIS_NEAR_CACHE
+    if settings.REDIS_SHARDS:
+        return ShardedRedisStorage.from_urls(
+            [dsn.unicode_string() for dsn in settings.REDIS_SHARDS],
+            vnodes=settings.REDIS_SHARD_VIRTUAL_NODES,
+            near_cache=near_cache,
+        )
+    return RedisStorage.from_url(settings.REDIS_DSN.unicode_string(), near_cache=near_cache)
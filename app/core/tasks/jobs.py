@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import signal
+
+
+logger = logging.getLogger(__name__)
+
+
+async def send_verification_code(email: str, code: int) -> None:
+    from app.services import email_service
+    await email_service.send_verification_email(email=email, code=code)
+    logger.info('Verification email was sent to [%s]', email)
+
+
+async def send_post_signup_email(email: str) -> None:
+    from app.services import email_service
+    await email_service.send_success_signup_email(email=email)
+    logger.info('Post signup email was sent to [%s]', email)
+
+
+handlers = {
+    'send_verification_code': send_verification_code,
+    'send_post_signup_email': send_post_signup_email,
+}
+
+
+async def run_worker() -> None:
+    from app.core.jobs import JobWorker
+    from app.core.storage import create_storage
+    from app.services import email_service
+    storage = create_storage()
+    worker = JobWorker(storage=storage, handlers=handlers)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await storage.close()
+        await email_service.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
@@ -0,0 +1,25 @@
+import logging
+
+from app.core.celery import celery_app
+from app.core.config import settings
+from app.core.tasks import worker
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _relay_outbox() -> int:
+    from app.core.jobs import JobQueue
+    from app.services.outbox import OutboxService
+    # tasks are sent to celery broker without job queue, no storage is needed then
+    job_queue = JobQueue(storage=worker.get_storage()) if settings.JOBS_RUNNER == 'streams' else None
+    return await OutboxService.relay(batch_size=settings.OUTBOX_RELAY_BATCH_SIZE, job_queue=job_queue)
+
+
+@celery_app.task(name='relay_outbox', ignore_result=True)
+def relay_outbox() -> int:
+    # database and storage connections are kept open by worker process between runs
+    sent = worker.run(_relay_outbox())
+    if sent:
+        logger.info('Outbox messages were relayed: [%s]', sent)
+    return sent
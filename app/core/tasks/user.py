@@ -1,24 +1,90 @@
 import logging
+import time
 
 from asgiref.sync import async_to_sync
 
 from app.core.celery import celery_app
+from app.core.config import settings
+from app.core.tasks import worker
 
 
 logger = logging.getLogger(__name__)
 
 
+@worker.on_close
+async def close_email_connections() -> None:
+    from app.services import email_service
+    await email_service.close()
+
+
 @celery_app.task(name='send_verification_code')
 def send_verification_code(email: str, code: int) -> None:
     from app.services import email_service
-    async_to_sync(email_service.send_verification_email)(email=email, code=code)
+    # smtp connections are kept open in worker process event loop between tasks
+    worker.run(email_service.send_verification_email(email=email, code=code))
     logger.info('Verification email was sent to [%s]', email)
     return None
 
 
 @celery_app.task(name='send_post_signup_email')
-def send_success_signup_password(email: str, password: str) -> None:
+def send_success_signup_password(email: str, **kwargs) -> None:
+    # messages queued by older releases carry the password, it is dropped unused
     from app.services import email_service
-    async_to_sync(email_service.send_success_signup_email)(email=email, password=password)
+    worker.run(email_service.send_success_signup_email(email=email))
     logger.info('Post signup email was sent to [%s]', email)
     return None
+
+
+async def _sweep_refresh_tokens() -> int:
+    from app.core.storage import create_storage
+    from app.services.user import UserService
+    storage = create_storage()
+    try:
+        user_service = UserService(storage=storage)
+        return await user_service.sweep_refresh_tokens(batch_size=settings.REFRESH_TOKENS_SWEEP_BATCH_SIZE)
+    finally:
+        await storage.close()
+
+
+@celery_app.task(name='sweep_refresh_tokens')
+def sweep_refresh_tokens() -> int:
+    if settings.STORAGE_BACKEND == 'memory':
+        # memory storage drops expired refresh tokens itself
+        return 0
+    removed = async_to_sync(_sweep_refresh_tokens)()
+    logger.info('Expired refresh tokens were removed: [%s]', removed)
+    return removed
+
+
+async def _revoke_all_tokens() -> None:
+    from app.core.storage import create_storage
+    from app.services.user import UserService
+    storage = create_storage()
+    try:
+        await UserService(storage=storage).revoke_all_tokens()
+    finally:
+        await storage.close()
+
+
+@celery_app.task(name='revoke_all_tokens', ignore_result=True)
+def revoke_all_tokens() -> None:
+    async_to_sync(_revoke_all_tokens)()
+    logger.warning('Access and refresh tokens of all users were revoked')
+    return None
+
+
+async def _purge_verification_codes() -> int:
+    from app.services.verification_code_store import DBVerificationCodeStore
+    return await DBVerificationCodeStore.purge_expired(
+        batch_size=settings.VERIFICATION_CODES_PURGE_BATCH_SIZE,
+        pause=settings.VERIFICATION_CODES_PURGE_PAUSE,
+    )
+
+
+@celery_app.task(name='purge_verification_codes')
+def purge_verification_codes() -> dict:
+    started_at = time.monotonic()
+    deleted = worker.run(_purge_verification_codes())
+    duration = time.monotonic() - started_at
+    logger.info('Expired verification codes were removed: [%s] in [%.3f]s', deleted, duration)
+    return {'deleted': deleted, 'duration': duration}
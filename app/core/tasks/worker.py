@@ -0,0 +1,79 @@
+__all__ = (
+    'get_storage',
+    'on_close',
+    'run',
+)
+
+import asyncio
+import contextvars
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.config import settings
+
+
+T = TypeVar('T')
+
+# event loop of the worker process, database connections and storage are opened in it once
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# every task runs in one context, so state kept in context vars by Tortoise outlives the run
+_context: Optional[contextvars.Context] = None
+_storage = None
+_close_callbacks: list[Callable[[], Coroutine]] = []
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Returns worker process event loop, Tortoise is initialised on the first call."""
+    global _loop, _context
+    if _loop is None:
+        from tortoise import Tortoise
+        loop = asyncio.new_event_loop()
+        context = contextvars.copy_context()
+        loop.run_until_complete(loop.create_task(Tortoise.init(settings.tortoise_config), context=context))
+        _loop, _context = loop, context
+    return _loop
+
+
+def get_storage():
+    """Returns storage of the worker process, it must be used in ``run`` only."""
+    global _storage
+    if _storage is None:
+        from app.core.storage import create_storage
+        _storage = create_storage()
+    return _storage
+
+
+def run(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Runs coroutine in worker process event loop. Prefork pool runs one task per process at a
+    time, so the loop is never shared by tasks.
+    """
+    loop = get_loop()
+    return loop.run_until_complete(loop.create_task(coroutine, context=_context))
+
+
+def on_close(callback: Callable[[], Coroutine]) -> Callable[[], Coroutine]:
+    """Registers coroutine function run in worker process event loop before it is closed."""
+    _close_callbacks.append(callback)
+    return callback
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs) -> None:
+    get_loop()
+
+
+@worker_process_shutdown.connect
+def close_worker_process(**kwargs) -> None:
+    global _loop, _storage
+    if _loop is None:
+        return
+    from tortoise import Tortoise
+    for callback in _close_callbacks:
+        run(callback())
+    if _storage is not None:
+        run(_storage.close())
+        _storage = None
+    run(Tortoise.close_connections())
+    _loop.close()
+    _loop = None
@@ -0,0 +1,98 @@
+__all__ = (
+    'TimingWheel',
+)
+
+import math
+from typing import Hashable, Optional
+
+
+class TimingWheel:
+    """Hierarchical timing wheel of deadlines.
+
+    Level ``n`` has ``slots`` slots of ``slots ** n`` ticks each, so ``levels``
+    levels cover ``slots ** levels`` ticks of ``resolution`` seconds, later
+    deadlines wait in the last level. Scheduling and cancelling are O(1),
+    entries are moved one level down when their slot comes, so each entry is
+    touched at most ``levels`` times before it is due.
+    """
+
+    def __init__(self, resolution: float = 1.0, slots: int = 64, levels: int = 4, now: float = 0.0) -> None:
+        if slots & (slots - 1):
+            raise ValueError('Number of slots must be a power of two')
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._span = slots ** levels
+        self.tick = int(now / resolution)
+        self._wheels: list[list[set]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        # key -> deadline, level, slot
+        self._entries: dict[Hashable, tuple[float, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def _place(self, key: Hashable, deadline: float) -> bool:
+        """Puts key to slot of its deadline, returns False if it is already due."""
+        # key is never reported before its deadline
+        tick = math.ceil(deadline / self.resolution)
+        delta = tick - self.tick
+        if delta <= 0:
+            return False
+        tick = min(tick, self.tick + self._span - 1)
+        level = 0
+        while delta >= self.slots ** (level + 1) and level < self.levels - 1:
+            level += 1
+        index = (tick >> (self._bits * level)) & self._mask
+        self._wheels[level][index].add(key)
+        self._entries[key] = (deadline, level, index)
+        return True
+
+    def schedule(self, key: Hashable, deadline: float) -> bool:
+        """Schedules key to be due at deadline, replacing its previous deadline.
+        Returns False if deadline has already passed, then key is not scheduled.
+        """
+        self.cancel(key)
+        return self._place(key, deadline)
+
+    def cancel(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._wheels[entry[1]][entry[2]].discard(key)
+
+    def _pop(self, level: int, index: int) -> set:
+        keys = self._wheels[level][index]
+        if keys:
+            self._wheels[level][index] = set()
+        return keys
+
+    def advance(self, now: float) -> list:
+        """Moves wheel to now, returns keys which became due."""
+        target = int(now / self.resolution)
+        due = []
+        while self.tick < target:
+            if not self._entries:
+                self.tick = target
+                break
+            self.tick += 1
+            # slots of upper levels reached by the tick are spread over lower levels, highest first
+            top = 0
+            while top < self.levels - 1 and not self.tick & ((1 << (self._bits * (top + 1))) - 1):
+                top += 1
+            for level in range(top, 0, -1):
+                for key in self._pop(level, (self.tick >> (self._bits * level)) & self._mask):
+                    deadline = self._entries.pop(key)[0]
+                    if not self._place(key, deadline):
+                        due.append(key)
+            for key in self._pop(0, self.tick & self._mask):
+                del self._entries[key]
+                due.append(key)
+        return due
@@ -1,9 +1,9 @@
 from typing import Any, Optional
 
-from redis.asyncio.client import Redis
+from app.core.storage import CacheStorage
 
 services: dict[str, Any] = {}
-redis: Optional[Redis] = None
+storage: Optional[CacheStorage] = None
 
 
 def get_services(service: str):
@@ -1,27 +1,32 @@
-from redis import asyncio as aioredis
+import functools
+import inspect
+import logging
+import time
+from typing import Callable
+
 from tortoise import Tortoise
 
 from app import depends
+from app.core.admission import AdmissionController
 from app.core.config import settings
 from app.core.fastapi.auth.jwt.keys import generate_jwt_keys
-from app.core.storage import RedisStorage
-from app.services import UserService, EmailService
+from app.core.passwords import password_hasher
+from app.core.rate_limit import TokenBucketLimiter
+from app.core.storage import create_storage
+from app.services.token_blacklist import TokenBlacklistFilter
+from app.services.user import UserService
+from app.services.user_cache import UserCache
 from app.services.verification_code import VerificationCodeService
 
 
+logger = logging.getLogger(__name__)
+
+# phase name -> seconds, filled while the application starts
+startup_timings: dict[str, float] = {}
+
+
 async def create_pg_connection():
-    await Tortoise.init(
-        {
-            'connections': {
-                'default': settings.POSTGRES_DSN.unicode_string()
-            },
-            'apps': {
-                'user': {
-                    'models': ['app.models.db.user'],
-                },
-            }
-        }
-    )
+    await Tortoise.init(settings.tortoise_config)
 
 
 async def close_pg_connection():
@@ -29,26 +34,65 @@ async def close_pg_connection():
 
 
 async def start_redis():
-    depends.redis = aioredis.from_url(settings.REDIS_DSN.unicode_string())
+    depends.storage = create_storage(api=True)
 
 
 async def close_redis() -> None:
-    if depends.redis is not None:
-        await depends.redis.close()
+    if depends.storage is not None:
+        await depends.storage.close()
 
 
 async def init_services():
-    redis_storage = RedisStorage(depends.redis)
-    user_service = UserService(storage=redis_storage)
-    verification_code_service = VerificationCodeService
-    email_service = EmailService()
+    redis_storage = depends.storage
+    blacklist_filter = TokenBlacklistFilter(storage=redis_storage)
+    blacklist_filter.start()
+    user_cache = UserCache(storage=redis_storage)
+    user_cache.register_invalidation()
+    user_service = UserService(storage=redis_storage, blacklist_filter=blacklist_filter, user_cache=user_cache)
+    verification_code_service = VerificationCodeService.from_settings(storage=redis_storage)
+
+    rate_limiter = TokenBucketLimiter(storage=redis_storage, local_size=settings.RATE_LIMIT_LOCAL_SIZE)
 
     depends.services = {
         'user_service': user_service,
+        'rate_limiter': rate_limiter,
+        'admission_controller': AdmissionController(),
+        'blacklist_filter': blacklist_filter,
         'verification_code_service': verification_code_service,
-        'email_service': email_service,
     }
 
 
-on_startup = [generate_jwt_keys, create_pg_connection, start_redis, init_services]
-on_shutdown = [close_pg_connection, close_redis]
+async def close_services() -> None:
+    blacklist_filter = depends.services.get('blacklist_filter')
+    if blacklist_filter is not None:
+        await blacklist_filter.stop()
+
+
+async def close_password_hasher() -> None:
+    password_hasher.close()
+
+
+def timed_phase(handler: Callable) -> Callable:
+    """Records duration of a startup handler in ``startup_timings``."""
+    @functools.wraps(handler)
+    async def inner() -> None:
+        started_at = time.perf_counter()
+        result = handler()
+        if inspect.isawaitable(result):
+            await result
+        startup_timings[handler.__name__] = time.perf_counter() - started_at
+
+    return inner
+
+
+async def log_startup_report() -> None:
+    total = sum(startup_timings.values())
+    report = ', '.join(f'{phase}={duration:.3f}s' for phase, duration in startup_timings.items())
+    logger.info('Startup finished in %.3fs: %s', total, report)
+
+
+on_startup = [
+    *map(timed_phase, (generate_jwt_keys, create_pg_connection, start_redis, init_services)),
+    log_startup_report,
+]
+on_shutdown = [close_services, close_pg_connection, close_redis, close_password_hasher]
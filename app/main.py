@@ -4,8 +4,11 @@ from logging import config as logging_config
 import uvicorn as uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
+from starlette.middleware import Middleware
 from app.api.routers import api_router
 from app.core.config import settings
+from app.core.fastapi.auth.middleware import AuthMiddleware
+from app.core.fastapi.middleware import UserIdentityMapMiddleware
 from app.core.logger import LOGGING
 from app.events import on_shutdown, on_startup
 
@@ -18,6 +21,7 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
     on_startup=on_startup,
     on_shutdown=on_shutdown,
+    middleware=[Middleware(UserIdentityMapMiddleware), Middleware(AuthMiddleware)],
 )
 
 
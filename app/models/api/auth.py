@@ -1,5 +1,6 @@
 __all__ = (
     'TokenResponse',
+    'JWKSResponse',
 )
 
 
@@ -9,3 +10,7 @@ from pydantic import BaseModel
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
+
+
+class JWKSResponse(BaseModel):
+    keys: list[dict]
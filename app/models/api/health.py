@@ -0,0 +1,15 @@
+__all__ = (
+    'LoadResponse',
+)
+
+
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LoadResponse(BaseModel):
+    admission: dict
+    password_hasher: dict
+    near_cache: Optional[dict] = None
+    storage: Optional[dict] = None
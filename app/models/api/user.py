@@ -5,6 +5,7 @@ __all__ = (
     'UserSignup',
     'UserSignin',
     'RefreshToken',
+    'UserIdentity',
 )
 
 from datetime import datetime
@@ -69,3 +70,8 @@ class UserSignin(BaseModel):
 
 class RefreshToken(BaseModel):
     refresh_token: str
+
+
+class UserIdentity(BaseModel):
+    id: int
+    email: str | None = None
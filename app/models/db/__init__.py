@@ -1,2 +1,3 @@
 from .user import *
+from .outbox import *
 from .base import *
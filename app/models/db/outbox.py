@@ -0,0 +1,21 @@
+__all__ = (
+    'OutboxMessage',
+)
+
+from tortoise import fields
+from tortoise.models import Model
+
+
+class OutboxMessage(Model):
+    """Task message written in the same transaction as the data it is about."""
+    id = fields.BigIntField(pk=True)
+    task = fields.CharField(max_length=255)
+    kwargs = fields.JSONField(default=dict)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        app = 'user'
+        table = 'outbox_message'
+
+    def __str__(self) -> str:
+        return f'OutboxMessage(id={self.id}, task={self.task}, created_at={self.created_at})'
@@ -5,14 +5,12 @@ __all__ = (
 
 from typing import Dict
 
-from passlib.context import CryptContext
 from tortoise import fields
 from tortoise.models import Model
 
+from app.core.passwords import get_pwd_context, password_hasher
 from app.models.db.base import AbstractDates
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class User(Model):
     __module__ = 'user'
@@ -46,20 +44,30 @@ class User(Model):
     @classmethod
     def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
         """Verifies password with stores hash."""
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
 
     @classmethod
     def get_password_hash(cls, password: str) -> str:
         """Gets hash for plain password."""
-        return pwd_context.hash(password)
+        return get_pwd_context().hash(password)
+
+    @classmethod
+    async def averify_password(cls, plain_password: str, hashed_password: str) -> bool:
+        """Verifies password with stores hash outside of the event loop."""
+        return await password_hasher.verify(plain_password, hashed_password)
+
+    @classmethod
+    async def aget_password_hash(cls, password: str) -> str:
+        """Gets hash for plain password outside of the event loop."""
+        return await password_hasher.hash(password)
 
 
 class VerificationCode(AbstractDates):
     """User verification code."""
     id = fields.IntField(pk=True)
     email = fields.CharField(max_length=255, unique=True)
-    code = fields.IntField(unique=True)
-    expiration_at = fields.DatetimeField()
+    code = fields.IntField()
+    expiration_at = fields.DatetimeField(index=True)
 
     class Meta:
         app = 'user'
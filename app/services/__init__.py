@@ -1,4 +1,16 @@
-from .email import *
 from .base import *
 from .user import *
 from .verification_code import *
+from .verification_code_store import *
+from .token_blacklist import *
+from .user_cache import *
+from .identity_map import *
+from .outbox import *
+
+
+def __getattr__(name: str):
+    # mail delivery is only needed by the email worker, import it on first use
+    if name in ('EmailService', 'email_service'):
+        from app.services import email
+        return getattr(email, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -3,52 +3,83 @@ __all__ = (
     'EmailService',
 )
 
+from email.headerregistry import Address
+from email.message import EmailMessage
+from functools import cached_property
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 
 from app.core.config import settings
+from app.core.mail import AsyncSMTPConnectionPool
 
 
 class EmailService:
-    """Email base service."""
+    """Email base service. Messages are sent through a per process pool of SMTP connections,
+    templates are compiled once.
+    """
     VERIFICATION_EMAIL_SUBJECT = 'Verification'
     SUCCESS_SIGNUP_EMAIL_SUBJECT = 'Success registration'
+    TEMPLATE_FOLDER = Path(__file__).resolve().parent.parent / 'templates/email'
 
     def __init__(self):
-        self.connection_config = ConnectionConfig(
-            MAIL_USERNAME=settings.MAIL_USERNAME,
-            MAIL_PASSWORD=settings.MAIL_PASSWORD,
-            MAIL_FROM=settings.MAIL_FROM,
-            MAIL_PORT=settings.MAIL_PORT,
-            MAIL_SERVER=settings.MAIL_SERVER,
-            MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
-            MAIL_STARTTLS=True,
-            MAIL_SSL_TLS=False,
-            USE_CREDENTIALS=True,
-            TEMPLATE_FOLDER=Path(__file__).resolve().parent.parent / 'templates/email'
+        self.templates = Environment(
+            loader=FileSystemLoader(self.TEMPLATE_FOLDER),
+            autoescape=select_autoescape(),
+            # templates are deployed with the code, no need to stat files on every render
+            auto_reload=False,
         )
-        self.fast_mail = FastMail(self.connection_config)
 
-    async def send_verification_email(self, email: str, code: int) -> None:
-        """Sends verification email to user."""
-        message = MessageSchema(
+    @cached_property
+    def pool(self) -> AsyncSMTPConnectionPool:
+        return AsyncSMTPConnectionPool(
+            host=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            username=settings.MAIL_USERNAME,
+            password=settings.MAIL_PASSWORD,
+            starttls=True,
+            size=settings.MAIL_POOL_SIZE,
+            max_messages=settings.MAIL_CONNECTION_MAX_MESSAGES,
+        )
+
+    def get_template(self, template_name: str) -> Template:
+        return self.templates.get_template(template_name)
+
+    def build_message(self, email: str, subject: str, template_name: str, **context) -> EmailMessage:
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = Address(display_name=settings.MAIL_FROM_NAME, addr_spec=settings.MAIL_FROM)
+        message['To'] = email
+        message.set_content(self.get_template(template_name).render(**context), subtype='html')
+        return message
+
+    def build_verification_email(self, email: str, code: int) -> EmailMessage:
+        return self.build_message(
+            email=email,
             subject=self.VERIFICATION_EMAIL_SUBJECT,
-            recipients=[email],
-            tenplate_body={'code': code},
-            subtype='html',
+            template_name='verification_email.html',
+            code=code,
         )
-        await self.fast_mail.send_message(message, template_name='verification_email.html')
 
-    async def send_success_signup_email(self, email: str, password: str) -> None:
-        """Sends success email to user with password after oauth2 flow signup."""
-        message = MessageSchema(
+    def build_success_signup_email(self, email: str) -> EmailMessage:
+        return self.build_message(
+            email=email,
             subject=self.SUCCESS_SIGNUP_EMAIL_SUBJECT,
-            recipients=[email],
-            tenplate_body={'password': password},
-            subtype='html',
+            template_name='success_signup_email.html',
+            login=email,
         )
-        await self.fast_mail.send_message(message, template_name='success_signup_email.html')
+
+    async def send_verification_email(self, email: str, code: int) -> None:
+        """Sends verification email to user."""
+        await self.pool.send(self.build_verification_email(email=email, code=code))
+
+    async def send_success_signup_email(self, email: str) -> None:
+        """Sends success email to user after signup."""
+        await self.pool.send(self.build_success_signup_email(email=email))
+
+    async def close(self) -> None:
+        if 'pool' in self.__dict__:
+            await self.pool.close()
 
 
 email_service = EmailService()
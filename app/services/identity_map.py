@@ -0,0 +1,101 @@
+__all__ = (
+    'UserIdentityMap',
+    'get_user_identity_map',
+    'user_identity_map_context',
+)
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from app.models.db.user import User
+from app.services.user_cache import CachedUser, UserCache
+
+
+logger = logging.getLogger(__name__)
+
+_current_identity_map: ContextVar[Optional['UserIdentityMap']] = ContextVar('user_identity_map', default=None)
+
+
+class UserIdentityMap:
+    """Request scoped map of users loaded from database, by id and by email.
+
+    Route handlers, dependencies and services looking a user up during one
+    request share the same instance, so each user is queried at most once.
+    Missing users are remembered too until ``remember`` is called for them.
+    Copies of users read through user cache are kept apart, a user loaded
+    from database during the request is returned instead of its copy.
+    """
+    total_queries = 0
+    total_avoided_queries = 0
+
+    def __init__(self) -> None:
+        self._users: dict[tuple[str, Any], User | None] = {}
+        self._cached_users: dict[tuple[str, Any], CachedUser | None] = {}
+        self.queries = 0
+        self.avoided_queries = 0
+
+    def _avoid_query(self) -> None:
+        self.avoided_queries += 1
+        UserIdentityMap.total_avoided_queries += 1
+
+    async def get(self, field: str, value: Any) -> User | None:
+        key = (field, value)
+        if key in self._users:
+            self._avoid_query()
+            return self._users[key]
+
+        user = await User.filter(**{field: value}).first()
+        self.queries += 1
+        UserIdentityMap.total_queries += 1
+        if user is None:
+            self._users[key] = None
+        else:
+            self.remember(user)
+        return user
+
+    async def get_by_id(self, user_id: int) -> User | None:
+        return await self.get('id', user_id)
+
+    async def get_by_email(self, email: str) -> User | None:
+        return await self.get('email', email)
+
+    async def get_cached_by_email(self, email: str, user_cache: UserCache) -> User | CachedUser | None:
+        key = ('email', email)
+        if self._users.get(key) is not None:
+            self._avoid_query()
+            return self._users[key]
+        if key in self._cached_users:
+            self._avoid_query()
+            return self._cached_users[key]
+
+        user = await user_cache.get_by_email(email)
+        self._cached_users[key] = user
+        return user
+
+    def remember(self, user: User) -> None:
+        self._users[('id', user.id)] = user
+        self._users[('email', user.email)] = user
+
+
+def get_user_identity_map() -> Optional[UserIdentityMap]:
+    """Returns identity map of current request, None outside of a request."""
+    return _current_identity_map.get()
+
+
+@contextmanager
+def user_identity_map_context() -> Iterator[UserIdentityMap]:
+    identity_map = UserIdentityMap()
+    token = _current_identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _current_identity_map.reset(token)
+        if identity_map.avoided_queries:
+            logger.debug(
+                'User identity map: %d queries, %d avoided (%d avoided in total)',
+                identity_map.queries,
+                identity_map.avoided_queries,
+                UserIdentityMap.total_avoided_queries,
+            )
@@ -0,0 +1,65 @@
+__all__ = (
+    'OutboxService',
+)
+
+import logging
+from typing import Optional
+
+from app.core.jobs import JobQueue
+from app.models.db.outbox import OutboxMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxService:
+    """Transactional outbox of celery tasks.
+
+    Tasks are written to ``OutboxMessage`` table inside the caller transaction,
+    so they are sent only if it commits and request handling makes no broker
+    calls. ``relay`` drains the table to the job queue or celery in batches.
+    """
+    @staticmethod
+    async def enqueue(task: str, **kwargs) -> OutboxMessage:
+        """Adds task message to outbox, in current transaction if there is one."""
+        return await OutboxMessage.create(task=task, kwargs=kwargs)
+
+    @staticmethod
+    async def relay_batch(batch_size: int, job_queue: Optional[JobQueue] = None) -> int:
+        """Sends one batch of the oldest outbox messages to job queue, or to celery broker without
+        it, and deletes them. Messages locked by another relay are skipped. Returns number of sent
+        messages.
+        """
+        from tortoise.transactions import in_transaction
+
+        async with in_transaction():
+            messages = await (
+                OutboxMessage
+                .select_for_update(skip_locked=True)
+                .order_by('id')
+                .limit(batch_size)
+            )
+            if not messages:
+                return 0
+            # a failed publish rolls the batch back, so messages are sent at least once
+            if job_queue is not None:
+                batch = job_queue.storage.batch(transaction=False)
+                for message in messages:
+                    job_queue.add(batch, message.task, **message.kwargs)
+                await batch.execute()
+            else:
+                from app.core.celery import celery_app
+                for message in messages:
+                    celery_app.send_task(message.task, kwargs=message.kwargs)
+            await OutboxMessage.filter(id__in=[message.id for message in messages]).delete()
+        return len(messages)
+
+    @classmethod
+    async def relay(cls, batch_size: int, job_queue: Optional[JobQueue] = None) -> int:
+        """Drains outbox to job queue or celery broker. Returns number of sent messages."""
+        sent = 0
+        while True:
+            batch_sent = await cls.relay_batch(batch_size=batch_size, job_queue=job_queue)
+            sent += batch_sent
+            if batch_sent < batch_size:
+                return sent
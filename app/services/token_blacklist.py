@@ -0,0 +1,144 @@
+__all__ = (
+    'TokenBlacklistFilter',
+)
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBlacklistFilter:
+    """Process local Bloom filter of blacklisted access token ids.
+
+    Every blacklisted jti is also sent to ``STREAM_KEY`` stream. The filter is
+    built from the stream on start and is kept current by reading it in
+    background. While the filter is not in sync ``might_contain`` answers True,
+    so callers fall back to the storage. Ids blacklisted by this process are
+    added with ``add`` at once, without waiting for the stream.
+    """
+    STREAM_KEY = 'access-token-blacklist'
+    READ_BATCH_SIZE = 500
+    READ_BLOCK_MS = 1000
+
+    def __init__(
+            self,
+            storage,
+            capacity: Optional[int] = None,
+            error_rate: Optional[float] = None,
+            rebuild_interval: Optional[int] = None,
+    ) -> None:
+        self.storage = storage
+        self.capacity = capacity or settings.BLACKLIST_FILTER_CAPACITY
+        self.error_rate = error_rate or settings.BLACKLIST_FILTER_ERROR_RATE
+        # blacklisted ids are useless after access tokens expire, filter is rebuilt to forget them
+        self.rebuild_interval = rebuild_interval or settings.JWT_TOKEN_MAX_AGE
+        self.filter = BloomFilter(capacity=self.capacity, error_rate=self.error_rate)
+        self.ready = False
+        self.positives = 0
+        self.negatives = 0
+        self._last_id: bytes | str = '0-0'
+        self._rebuilt_at = 0.0
+        # ids added while rebuild reads the stream, they may be missing from the new filter
+        self._added_during_rebuild: Optional[list[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_min_id() -> str:
+        """Returns id of the oldest stream message which may refer to an unexpired token."""
+        return f'{int((time.time() - settings.JWT_TOKEN_MAX_AGE) * 1000)}-0'
+
+    def might_contain(self, token_id: str) -> bool:
+        """Returns False only if token id is surely not blacklisted."""
+        if not self.ready or token_id in self.filter:
+            self.positives += 1
+            return True
+        self.negatives += 1
+        return False
+
+    def add(self, token_id: str) -> None:
+        """Adds token id blacklisted by this process."""
+        self.filter.add(token_id)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(token_id)
+
+    async def rebuild(self) -> None:
+        """Builds new filter from blacklisted ids of unexpired tokens."""
+        bloom = BloomFilter(capacity=self.capacity, error_rate=self.error_rate)
+        last_id = self.get_min_id()
+        min_id = last_id
+        self._added_during_rebuild = []
+        try:
+            while True:
+                messages = await self.storage.read_range(self.STREAM_KEY, min_id=min_id, count=self.READ_BATCH_SIZE)
+                for message_id, fields in messages:
+                    bloom.add(fields[b'jti'].decode())
+                    last_id = message_id
+                if len(messages) < self.READ_BATCH_SIZE:
+                    break
+                min_id = b'(' + last_id
+            for token_id in self._added_during_rebuild:
+                bloom.add(token_id)
+        finally:
+            self._added_during_rebuild = None
+
+        self.filter = bloom
+        self._last_id = last_id
+        self._rebuilt_at = time.monotonic()
+        self.ready = True
+        logger.info('Access token blacklist filter was rebuilt: %s', self.stats())
+
+    async def run(self) -> None:
+        """Keeps filter in sync with blacklist stream."""
+        while True:
+            try:
+                if not self.ready or time.monotonic() - self._rebuilt_at > self.rebuild_interval:
+                    await self.rebuild()
+                response = await self.storage.read(
+                    self.STREAM_KEY,
+                    last_msg_id=self._last_id,
+                    count=self.READ_BATCH_SIZE,
+                    block=self.READ_BLOCK_MS,
+                )
+                for _, messages in response:
+                    for message_id, fields in messages:
+                        self.filter.add(fields[b'jti'].decode())
+                        self._last_id = message_id
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa
+                logger.exception('Access token blacklist filter is out of sync')
+                self.ready = False
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+    def stats(self) -> dict:
+        return {
+            'ready': self.ready,
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'estimated_error_rate': self.filter.estimated_error_rate,
+            'memory': self.filter.memory,
+            'count': self.filter.count,
+            'positives': self.positives,
+            'negatives': self.negatives,
+        }
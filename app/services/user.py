@@ -1,60 +1,161 @@
 import datetime
+import time
 from http import HTTPStatus
+from typing import Optional
 
 from fastapi import HTTPException
 from pydantic import EmailStr
-from tortoise.transactions import atomic
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
 
+from app.cache.memory import TTLCache
 from app.core.config import settings
 from app.core.enums.jwt import JwtTokenTypeEnum
 from app.core.errors import UserServiceError
-from app.core.fastapi.auth.jwt.jwt import create_jwt_token, ACCESS_TOKEN_SUB, get_jti
-from app.core.fastapi.constants import USER_DOES_NOT_EXISTS_EXCEPTION
-from app.core.tasks.user import send_success_signup_password
+from app.core.fastapi.auth.jwt.jwt import token_minter, ACCESS_TOKEN_SUB
+from app.core.fastapi.constants import USER_DOES_NOT_EXISTS_EXCEPTION, USER_EXISTS_EXCEPTION
+from app.core.storage import RedisBatch
 from app.models.api.auth import TokenResponse
 from app.models.api.user import UserSignup, UserSignin
-from app.models.db.user import User, VerificationCode
+from app.models.db.user import User
 from app.services.base import BaseService
+from app.services.identity_map import get_user_identity_map
+from app.services.outbox import OutboxService
+from app.services.token_blacklist import TokenBlacklistFilter
+from app.services.user_cache import CachedUser, UserCache
+from app.services.verification_code import VerificationCodeService
 
 
 class UserService(BaseService):
     """User base service."""
+    REFRESH_TOKENS_KEY_PREFIX = 'user-refresh-tokens-'
+
+    # tokens issued until these millisecond timestamps are revoked
+    USER_NOT_BEFORE_KEY_PREFIX = 'user-not-before-'
+    GLOBAL_NOT_BEFORE_KEY = 'tokens-not-before'
+
+    def __init__(
+            self,
+            storage,
+            blacklist_filter: Optional[TokenBlacklistFilter] = None,
+            user_cache: Optional[UserCache] = None,
+    ):
+        super().__init__(storage)
+        self.blacklist_filter = blacklist_filter
+        self.user_cache = user_cache
+        self.revocation_epochs = TTLCache(
+            max_size=settings.REVOCATION_EPOCH_CACHE_SIZE,
+            ttl=settings.REVOCATION_EPOCH_CACHE_TTL,
+        )
+
     @staticmethod
     async def get_user_by_login(email: str) -> User | None:
-        """Gets user by email."""
-        return await User.filter(email=email).first()
+        """Gets user by email, at most once per request."""
+        identity_map = get_user_identity_map()
+        if identity_map is None:
+            return await User.filter(email=email).first()
+        return await identity_map.get_by_email(email)
 
     @staticmethod
-    async def create_user(email: EmailStr, password: str) -> User:
-        """Creates user with email and hashed password."""
-        user = await User.create(email=email,
-                                 password=User.get_password_hash(password),
-                                 last_login=datetime.datetime.now())
+    async def get_user_by_id(user_id: int) -> User | None:
+        """Gets user by id, at most once per request."""
+        identity_map = get_user_identity_map()
+        if identity_map is None:
+            return await User.filter(id=user_id).first()
+        return await identity_map.get_by_id(user_id)
+
+    async def get_cached_user_by_login(self, email: str) -> User | CachedUser | None:
+        """Gets user by email through user cache, at most once per request. Cached user has no password
+        and cannot be saved.
+        """
+        if self.user_cache is None:
+            return await self.get_user_by_login(email=email)
+        identity_map = get_user_identity_map()
+        if identity_map is None:
+            return await self.user_cache.get_by_email(email)
+        return await identity_map.get_cached_by_email(email, user_cache=self.user_cache)
+
+    @staticmethod
+    async def insert_user(email: EmailStr, password_hash: str) -> User:
+        """Inserts user with already hashed password. Duplicate email is detected from unique
+        constraint conflict of the insert.
+        """
+        try:
+            user = await User.create(email=email, password=password_hash, last_login=datetime.datetime.now())
+        except IntegrityError as exc:
+            if not UserService.is_email_conflict(exc):
+                raise
+            raise UserServiceError(
+                USER_EXISTS_EXCEPTION.format(email=email),
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            )
+        identity_map = get_user_identity_map()
+        if identity_map is not None:
+            identity_map.remember(user)
         return user
 
-    async def create_token_pair(self, user: User) -> TokenResponse:
-        """Creates access and refresh tokens, adds refresh token to active user refresh tokens list."""
-        access_token = create_jwt_token(user_id=user.id,
-                                        token_type=JwtTokenTypeEnum.access,
-                                        sub=ACCESS_TOKEN_SUB,
-                                        email=user.email)
-        refresh_token = create_jwt_token(user_id=user.id,
-                                         token_type=JwtTokenTypeEnum.refresh,
+    @staticmethod
+    def is_email_conflict(exc: IntegrityError) -> bool:
+        """Returns True if exc is violation of unique email constraint of users table."""
+        # postgres names the violated constraint, sqlite only mentions the column
+        constraint_name = getattr(exc.__cause__, 'constraint_name', None)
+        if constraint_name is not None:
+            return constraint_name == f'{User._meta.db_table}_email_key'
+        return f'{User._meta.db_table}.email' in str(exc)
+
+    @classmethod
+    async def create_user(cls, email: EmailStr, password: str) -> User:
+        """Creates user with email and hashed password."""
+        return await cls.insert_user(email=email, password_hash=await User.aget_password_hash(password))
+
+    @classmethod
+    def get_refresh_tokens_key(cls, user_id: int) -> str:
+        # user id is a hash tag, all keys of user are kept on one storage shard
+        return f'{cls.REFRESH_TOKENS_KEY_PREFIX}{{{user_id}}}'
+
+    @classmethod
+    def get_user_not_before_key(cls, user_id: int) -> str:
+        return f'{cls.USER_NOT_BEFORE_KEY_PREFIX}{{{user_id}}}'
+
+    @staticmethod
+    def mint_token_pair(user: User) -> tuple[TokenResponse, dict]:
+        """Creates access and refresh tokens, returns them with refresh token payload."""
+        access_token = token_minter.mint(user_id=user.id,
+                                         token_type=JwtTokenTypeEnum.access,
                                          sub=ACCESS_TOKEN_SUB,
                                          email=user.email)
-        await self.storage.set_add(
-            key=f'user-refresh-{user.id}',
-            value=get_jti(refresh_token),
+        refresh_token = token_minter.mint(user_id=user.id,
+                                          token_type=JwtTokenTypeEnum.refresh,
+                                          sub=ACCESS_TOKEN_SUB,
+                                          email=user.email)
+        token_pair = TokenResponse(access_token=access_token.token, refresh_token=refresh_token.token)
+        return token_pair, refresh_token.payload
+
+    async def create_token_pair(self, user: User) -> TokenResponse:
+        """Creates access and refresh tokens, adds refresh token to active user refresh tokens list."""
+        token_pair, refresh_token_payload = self.mint_token_pair(user=user)
+        await self.storage.expiring_set_add(
+            key=self.get_refresh_tokens_key(user.id),
+            value=refresh_token_payload['jti'],
+            expire_at=refresh_token_payload['exp'],
         )
-        return TokenResponse(access_token=access_token, refresh_token=refresh_token)
+        return token_pair
 
-    @atomic()
-    async def signup(self, user_data: UserSignup) -> TokenResponse:
-        """Signup user and cleans user verification codes."""
-        user = await self.create_user(email=user_data.email, password=user_data.password)
+    async def signup(
+            self,
+            user_data: UserSignup,
+            verification_code_service: VerificationCodeService,
+    ) -> TokenResponse:
+        """Signup user. Only user insert, verification code redemption and post signup email outbox
+        message are written in transaction, password hashing and tokens are handled outside of it.
+        Verification code is redeemed last, so signup failed before keeps it.
+        """
+        password_hash = await User.aget_password_hash(user_data.password)
+        async with in_transaction():
+            user = await self.insert_user(email=user_data.email, password_hash=password_hash)
+            await OutboxService.enqueue('send_post_signup_email', email=user.email)
+            await verification_code_service.redeem_verification_code(email=user_data.email, code=user_data.code)
         token_pair = await self.create_token_pair(user=user)
-        await VerificationCode.filter(email=user.email).delete()
-        send_success_signup_password.delay(email=user.email, password=user_data.password)
         return token_pair
 
     async def signin(self, user_data: UserSignin) -> TokenResponse:
@@ -65,7 +166,7 @@ class UserService(BaseService):
                 USER_DOES_NOT_EXISTS_EXCEPTION.format(email=user_data.email),
                 status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
             )
-        if not User.verify_password(plain_password=user_data.password, hashed_password=user.password):
+        if not await User.averify_password(plain_password=user_data.password, hashed_password=user.password):
             raise UserServiceError(
                 'User password missmatch!',
                 status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
@@ -75,39 +176,128 @@ class UserService(BaseService):
         return token_pair
 
     async def check_access_token_blacklisted(self, access_token_id: str) -> None:
-        """Checks access token saved as blacklisted."""
+        """Checks access token saved as blacklisted. Storage is queried only if blacklist filter
+        cannot tell token is surely not blacklisted.
+        """
+        if self.blacklist_filter is not None and not self.blacklist_filter.might_contain(access_token_id):
+            return None
         token = await self.storage.get(key=access_token_id)
         if token is not None:
             raise HTTPException(status_code=400, detail="Inactive access token!")
         return None
 
+    @staticmethod
+    def _blacklist_access_token(batch: RedisBatch, access_token_id: str) -> RedisBatch:
+        """Queues blacklisting of access token and its announce to blacklist filters."""
+        return (
+            batch
+            .set(key=access_token_id, value='', exp=settings.JWT_TOKEN_MAX_AGE)
+            .send(
+                TokenBlacklistFilter.STREAM_KEY,
+                fields={'jti': access_token_id},
+                min_id=TokenBlacklistFilter.get_min_id(),
+            )
+        )
+
+    def _add_to_blacklist_filter(self, access_token_id: str) -> None:
+        """Adds blacklisted token to local filter at once, it would reach it from the stream later."""
+        if self.blacklist_filter is not None:
+            self.blacklist_filter.add(access_token_id)
+
     async def add_access_token_to_blacklist(self, access_token_id: str) -> None:
-        await self.storage.set(key=access_token_id, value='', exp=settings.JWT_TOKEN_MAX_AGE)
+        await self._blacklist_access_token(self.storage.batch(), access_token_id=access_token_id).execute()
+        self._add_to_blacklist_filter(access_token_id)
+        return None
+
+    @staticmethod
+    def get_new_revocation_epoch() -> int:
+        """Returns epoch revoking tokens issued until now, in milliseconds."""
+        return time.time_ns() // 1_000_000
+
+    async def get_revocation_epoch(self, user_id: int) -> int:
+        """Gets millisecond timestamp user tokens issued until are revoked, 0 if there is none.
+        Value is cached in process for REVOCATION_EPOCH_CACHE_TTL seconds.
+        """
+        epoch = self.revocation_epochs.get(user_id)
+        if epoch is None:
+            user_epoch, global_epoch = await self.storage.get_many(
+                keys=[self.get_user_not_before_key(user_id), self.GLOBAL_NOT_BEFORE_KEY],
+            )
+            epoch = max(int(user_epoch or 0), int(global_epoch or 0))
+            self.revocation_epochs.set(user_id, epoch)
+        return epoch
+
+    async def check_token_is_not_revoked(self, user_id: int, issued_at_ms: int) -> None:
+        """Checks token was issued after all user tokens were revoked."""
+        if issued_at_ms <= await self.get_revocation_epoch(user_id=user_id):
+            raise HTTPException(status_code=400, detail="Revoked token!")
+        return None
+
+    async def revoke_user_tokens(self, user_id: int) -> None:
+        """Revokes all user access and refresh tokens issued until now with a single write."""
+        epoch = self.get_new_revocation_epoch()
+        await self.storage.set(
+            key=self.get_user_not_before_key(user_id),
+            value=epoch,
+            exp=settings.JWT_REFRESH_TOKEN_EXPIRATION * 24 * 60 * 60,
+        )
+        self.revocation_epochs.set(user_id, epoch)
+        return None
+
+    async def revoke_all_tokens(self) -> None:
+        """Revokes access and refresh tokens of all users issued until now with a single write."""
+        await self.storage.set(
+            key=self.GLOBAL_NOT_BEFORE_KEY,
+            value=self.get_new_revocation_epoch(),
+            exp=settings.JWT_REFRESH_TOKEN_EXPIRATION * 24 * 60 * 60,
+        )
+        self.revocation_epochs.clear()
         return None
 
     async def check_refresh_token_is_active(self, user_id: int, access_token_id: str) -> None:
         """Checks refresh token in user refresh tokens list."""
-        token_is_active = await self.storage.value_in_set(key=f'user-refresh-{user_id}', value=access_token_id)
+        token_is_active = await self.storage.value_in_expiring_set(key=self.get_refresh_tokens_key(user_id),
+                                                                   value=access_token_id)
         if not token_is_active:
             raise HTTPException(status_code=400, detail="Inactive refresh token!")
         return None
 
     async def clean_user_refresh_token_list(self, user_id: int) -> None:
-        await self.storage.delete(key=f'user-refresh-{user_id}')
+        await self.storage.delete(key=self.get_refresh_tokens_key(user_id))
         return None
 
     async def delete_user_refresh_token(self, user_id: int, access_token_id: str) -> None:
-        await self.storage.delete_set_value(key=f'user-refresh-{user_id}', value=access_token_id)
+        await self.storage.delete_expiring_set_value(key=self.get_refresh_tokens_key(user_id),
+                                                     value=access_token_id)
         return None
 
     async def logout(self, user_id: int, access_token_id: str) -> None:
-        """Logout user. Deletes all user active refresh tokens. Adds access token to blacklist."""
-        await self.add_access_token_to_blacklist(access_token_id=access_token_id)
-        await self.clean_user_refresh_token_list(user_id=user_id)
+        """Logout user. Deletes all user active refresh tokens. Adds access token to blacklist.
+        Both are done in one round trip.
+        """
+        batch = self._blacklist_access_token(self.storage.batch(), access_token_id=access_token_id)
+        await batch.delete(key=self.get_refresh_tokens_key(user_id)).execute()
+        self._add_to_blacklist_filter(access_token_id)
         return None
 
     async def refresh_token_pair(self, user: User, access_token_id: str) -> TokenResponse:
-        """Creates new access-refresh token pair and deletes old refresh token."""
-        await self.delete_user_refresh_token(user_id=user.id, access_token_id=access_token_id)
-        token_pair = await self.create_token_pair(user=user)
+        """Creates new access-refresh token pair, atomically consumes old refresh token and registers
+        the new one. A refresh token can be used only once, replays are rejected.
+        """
+        token_pair, refresh_token_payload = self.mint_token_pair(user=user)
+        rotated = await self.storage.replace_expiring_set_value(
+            key=self.get_refresh_tokens_key(user.id),
+            value=access_token_id,
+            new_value=refresh_token_payload['jti'],
+            expire_at=refresh_token_payload['exp'],
+        )
+        if not rotated:
+            raise HTTPException(status_code=400, detail="Inactive refresh token!")
         return token_pair
+
+    async def sweep_refresh_tokens(self, batch_size: int) -> int:
+        """Removes expired refresh tokens of all users."""
+        return await self.storage.prune_expiring_sets(
+            match=f'{self.REFRESH_TOKENS_KEY_PREFIX}*',
+            count=batch_size,
+        )
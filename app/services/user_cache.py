@@ -0,0 +1,199 @@
+__all__ = (
+    'CachedUser',
+    'UserCache',
+)
+
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+import orjson
+from tortoise.signals import post_delete, post_save
+
+from app.cache.memory import TTLCache
+from app.core.config import settings
+from app.models.db.user import User
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Cached copy of user without password, it cannot be used to check credentials or be saved."""
+    id: int
+    email: str
+    last_login: Optional[datetime]
+    is_superuser: bool
+    is_staff: bool
+    is_active: bool
+    date_joined: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        return cls(
+            id=user.id,
+            email=user.email,
+            last_login=user.last_login,
+            is_superuser=user.is_superuser,
+            is_staff=user.is_staff,
+            is_active=user.is_active,
+            date_joined=user.date_joined,
+        )
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'CachedUser':
+        fields = orjson.loads(data)
+        for field in ('last_login', 'date_joined'):
+            if fields[field] is not None:
+                fields[field] = datetime.fromisoformat(fields[field])
+        return cls(**fields)
+
+
+class UserCache:
+    """Two-tier cache of users for authenticated request resolution.
+
+    Users are kept in an in-process LRU for ``USER_CACHE_LOCAL_TTL`` seconds and
+    in the storage for ``USER_CACHE_TTL`` seconds, under both id and email keys.
+    Concurrent misses for the same key share one database query. Users are
+    returned as ``CachedUser`` copies without password.
+
+    Cached user is invalidated by ``post_save`` and ``post_delete`` signals of
+    ``User`` instances. Bulk ``User.filter(...).update()`` and ``.delete()``
+    send no signals, callers must ``invalidate`` changed users themselves.
+
+    Invalidation replaces the keys with a tombstone for ``TOMBSTONE_TTL`` seconds
+    and loaded users are written only to keys which are still missing, so a load
+    racing with invalidation never caches the user read before the change.
+    """
+    KEY_PREFIX = 'user-cache-'
+    TOMBSTONE = b'-'
+    # longer than any user load takes
+    TOMBSTONE_TTL = 10
+
+    def __init__(
+            self,
+            storage,
+            max_size: Optional[int] = None,
+            ttl: Optional[int] = None,
+            local_ttl: Optional[int] = None,
+    ) -> None:
+        self.storage = storage
+        self.ttl = ttl or settings.USER_CACHE_TTL
+        self.local = TTLCache(
+            max_size=settings.USER_CACHE_SIZE if max_size is None else max_size,
+            ttl=settings.USER_CACHE_LOCAL_TTL if local_ttl is None else local_ttl,
+        )
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._invalidations = 0
+        self.db_queries = 0
+
+    @classmethod
+    def _key(cls, field: str, value: Any) -> str:
+        return f'{cls.KEY_PREFIX}{field}-{value}'
+
+    @classmethod
+    def _keys(cls, user: User | CachedUser) -> tuple[str, str]:
+        return cls._key('id', user.id), cls._key('email', user.email)
+
+    async def get_by_id(self, user_id: int) -> CachedUser | None:
+        return await self._get('id', user_id)
+
+    async def get_by_email(self, email: str) -> CachedUser | None:
+        return await self._get('email', email)
+
+    async def _get(self, field: str, value: Any) -> CachedUser | None:
+        key = self._key(field, value)
+        user = self.local.get(key)
+        if user is not None:
+            return user
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._in_flight[key] = asyncio.ensure_future(self._load(field, value, key))
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, field: str, value: Any, key: str) -> CachedUser | None:
+        invalidations = self._invalidations
+        data = await self.storage.get(key=key)
+        if data is not None and data != self.TOMBSTONE:
+            user = CachedUser.loads(data)
+        else:
+            self.db_queries += 1
+            db_user = await User.filter(**{field: value}).first()
+            if db_user is None:
+                return None
+            user = CachedUser.from_user(db_user)
+            if not await self._store(user):
+                return user
+
+        if invalidations == self._invalidations:
+            for user_key in self._keys(user):
+                self.local.set(user_key, user)
+        return user
+
+    async def _store(self, user: CachedUser) -> bool:
+        """Writes user to storage keys which are missing. Returns False if any key was invalidated
+        since, written keys are dropped then.
+        """
+        keys = self._keys(user)
+        data = user.dumps()
+        batch = self.storage.batch()
+        for user_key in keys:
+            batch.set(key=user_key, value=data, exp=self.ttl, nx=True)
+        written = await batch.execute()
+        if all(written):
+            return True
+        batch = self.storage.batch(transaction=False)
+        for user_key, is_written in zip(keys, written):
+            if is_written:
+                batch.delete(key=user_key)
+        await batch.execute()
+        return False
+
+    async def invalidate(self, user: User | CachedUser) -> None:
+        """Drops user from both cache tiers, under previous email too if it was changed.
+        Other processes keep local copy up to USER_CACHE_LOCAL_TTL.
+        """
+        keys = set(self._keys(user))
+        id_key = self._key('id', user.id)
+        cached_user = self.local.get(id_key)
+        if cached_user is None:
+            data = await self.storage.get(key=id_key)
+            if data is not None and data != self.TOMBSTONE:
+                cached_user = CachedUser.loads(data)
+        if cached_user is not None:
+            keys.add(self._key('email', cached_user.email))
+
+        batch = self.storage.batch(transaction=False)
+        for user_key in keys:
+            batch.set(key=user_key, value=self.TOMBSTONE, exp=self.TOMBSTONE_TTL)
+        await batch.execute()
+        # loads started before are not kept locally
+        self._invalidations += 1
+        for user_key in keys:
+            self.local.delete(user_key)
+
+    def register_invalidation(self) -> None:
+        """Invalidates cached user on every save and delete of ``User`` model."""
+        @post_save(User)
+        async def invalidate_saved_user(sender, instance, created, using_db, update_fields) -> None:
+            if not created:
+                await self.invalidate(instance)
+
+        @post_delete(User)
+        async def invalidate_deleted_user(sender, instance, using_db) -> None:
+            await self.invalidate(instance)
+
+    def stats(self) -> dict:
+        return {
+            **self.local.stats(),
+            'in_flight': len(self._in_flight),
+            'db_queries': self.db_queries,
+        }
@@ -2,68 +2,67 @@ __all__ = (
     'VerificationCodeService',
 )
 
-from datetime import datetime, timedelta
-
+from contextlib import nullcontext
+from datetime import timedelta
 from http import HTTPStatus
+from typing import Optional
+
 from pydantic import EmailStr
-from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
 
 from app.core.config import settings
 from app.core.errors import VerificationCodeServiceError
-from app.core.utils import random_with_n_digits
-from app.core.tasks.user import send_verification_code
-from app.models.db import VerificationCode
+from app.services.outbox import OutboxService
+from app.services.verification_code_store import (
+    VerificationCodeStore,
+    DBVerificationCodeStore,
+    RedisVerificationCodeStore,
+    VerificationCodeAllocator,
+)
 
 
 class VerificationCodeService:
     """Verification code base service."""
-    @staticmethod
-    async def get_verification_code(code: int) -> VerificationCode | None:
-        """Gets unexpired verification code."""
-        return await VerificationCode.filter(code=code, expiration_at__gt=datetime.now()).first()
+    def __init__(self, store: VerificationCodeStore) -> None:
+        self.store = store
 
     @classmethod
-    async def validate_verification_code(cls, email: EmailStr, code: int) -> VerificationCode:
-        """Validates verification code and user email."""
-        verification_code = await cls.get_verification_code(code=code)
-        if not verification_code:
+    def from_settings(cls, storage) -> 'VerificationCodeService':
+        """Creates service with the store chosen by VERIFICATION_CODE_STORE setting."""
+        if settings.VERIFICATION_CODE_STORE == 'db':
+            return cls(store=DBVerificationCodeStore(allocator=VerificationCodeAllocator(storage=storage)))
+        return cls(store=RedisVerificationCodeStore(storage=storage))
+
+    async def validate_verification_code(self, email: EmailStr, code: int) -> None:
+        """Validates verification code and user email, the code is kept."""
+        if not await self.store.check(email=email, code=code):
             raise VerificationCodeServiceError(
                 'Verification code does not exist!',
                 status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
             )
-        if verification_code.email != email:
+        return None
+
+    async def redeem_verification_code(self, email: EmailStr, code: int) -> None:
+        """Deletes verification code of email if it is still valid, so it is used at most once."""
+        if not await self.store.redeem(email=email, code=code):
             raise VerificationCodeServiceError(
-                'Email and code mismatch!',
+                'Verification code does not exist!',
                 status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
             )
-        return verification_code
-
-    @staticmethod
-    async def create_verification_code(email: EmailStr, code_expiration: timedelta) -> VerificationCode:
-        """Creates verification code with uniq code number."""
-        attempts = 10
-        while attempts:
-            code = random_with_n_digits(settings.VERIFICATION_CODE_LENGTH)
-            try:
-                verification_code, _ = await VerificationCode.update_or_create(
-                    email=email,
-                    defaults={'code': code, 'expiration_at': datetime.now() + code_expiration},
-                )
-                return verification_code
-            except IntegrityError:
-                attempts -= 1
-
-        raise VerificationCodeServiceError(
-            'Cannot create confirmation sms. Non unique code',
-            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
-        )
+        return None
 
-    @classmethod
-    async def send_verification_code(cls, email: EmailStr) -> None:
-        """Creates and sends verification code via email."""
-        verification_code = await cls.create_verification_code(
+    async def create_verification_code(self, email: EmailStr, code_expiration: Optional[timedelta] = None) -> int:
+        """Creates verification code for email."""
+        return await self.store.create(
             email=email,
-            code_expiration=settings.VERIFICATION_CODE_EXPIRATION_DELTA,
+            code_expiration=code_expiration or settings.VERIFICATION_CODE_EXPIRATION_DELTA,
         )
-        send_verification_code.delay(email, verification_code.code)
+
+    async def send_verification_code(self, email: EmailStr) -> None:
+        """Creates verification code and queues its email. With database store both are written
+        in one transaction, other stores are not held inside of it.
+        """
+        async with in_transaction() if self.store.transactional else nullcontext():
+            code = await self.create_verification_code(email=email)
+            await OutboxService.enqueue('send_verification_code', email=email, code=code)
         return None
@@ -0,0 +1,148 @@
+__all__ = (
+    'VerificationCodeStore',
+    'DBVerificationCodeStore',
+    'RedisVerificationCodeStore',
+    'VerificationCodeAllocator',
+)
+
+import abc
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from tortoise.expressions import Q
+
+from app.core.config import settings
+from app.core.permutation import KeyedPermutation
+from app.core.utils import random_with_n_digits
+from app.models.db import VerificationCode
+
+
+class VerificationCodeAllocator:
+    """Issues globally unique verification codes in O(1), without retries.
+
+    Code space is shuffled with a keyed permutation, the key is shared by all
+    processes through the storage. A process reserves a block of consecutive
+    permutation indexes with one counter increment and issues codes from it, so
+    a code repeats only after the whole code space was issued.
+    """
+    BLOCK_COUNTER_KEY = 'verification-code-block'
+    PERMUTATION_KEY = 'verification-code-permutation-key'
+
+    def __init__(self, storage, length: Optional[int] = None, block_size: Optional[int] = None) -> None:
+        self.storage = storage
+        self.length = length or settings.VERIFICATION_CODE_LENGTH
+        self.block_size = block_size or settings.VERIFICATION_CODE_BLOCK_SIZE
+        self.first_code = 10 ** (self.length - 1)
+        self.code_space = 10 ** self.length - self.first_code
+        self._permutation: Optional[KeyedPermutation] = None
+        self._indexes: Iterator[int] = iter(())
+
+    async def _reserve_block(self) -> None:
+        if self._permutation is None:
+            key = await self.storage.set_default(key=self.PERMUTATION_KEY, value=secrets.token_bytes(32))
+            self._permutation = KeyedPermutation(size=self.code_space, key=key)
+        end = await self.storage.increment(key=self.BLOCK_COUNTER_KEY, amount=self.block_size)
+        self._indexes = iter(range(end - self.block_size, end))
+
+    async def allocate(self) -> int:
+        while (index := next(self._indexes, None)) is None:
+            await self._reserve_block()
+        return self.first_code + self._permutation[index % self.code_space]
+
+
+class VerificationCodeStore(abc.ABC):
+    """Keeps one unexpired verification code per email. Codes are looked up by email and code."""
+    # True if codes are written with the database connection and can join its transaction
+    transactional = False
+
+    @abc.abstractmethod
+    async def create(self, email: str, code_expiration: timedelta) -> int:
+        """Creates new verification code for email, replacing previous one. Returns the code."""
+
+    @abc.abstractmethod
+    async def check(self, email: str, code: int) -> bool:
+        """Returns True if code is the unexpired verification code of email."""
+
+    @abc.abstractmethod
+    async def redeem(self, email: str, code: int) -> bool:
+        """Atomically deletes verification code of email if it is unexpired code. Returns True if it was deleted,
+        so a code is redeemed at most once.
+        """
+
+
+class DBVerificationCodeStore(VerificationCodeStore):
+    """Keeps verification codes in ``VerificationCode`` table. Codes are allocated unique across
+    all emails, so the store also works with tables created with unique ``code`` column.
+    """
+    transactional = True
+
+    def __init__(self, allocator: VerificationCodeAllocator) -> None:
+        self.allocator = allocator
+
+    async def create(self, email: str, code_expiration: timedelta) -> int:
+        code = await self.allocator.allocate()
+        await VerificationCode.update_or_create(
+            email=email,
+            defaults={'code': code, 'expiration_at': datetime.now() + code_expiration},
+        )
+        return code
+
+    async def check(self, email: str, code: int) -> bool:
+        return await VerificationCode.filter(email=email, code=code, expiration_at__gt=datetime.now()).exists()
+
+    async def redeem(self, email: str, code: int) -> bool:
+        return bool(await VerificationCode.filter(email=email, code=code, expiration_at__gt=datetime.now()).delete())
+
+    @staticmethod
+    async def purge_expired(batch_size: int, pause: float = 0) -> int:
+        """Deletes expired verification codes in batches of at most batch_size rows, pausing between
+        batches. Batches are iterated by (expiration_at, id) keyset. Returns number of deleted rows.
+        """
+        now = datetime.now()
+        deleted = 0
+        cursor = None
+        while True:
+            query = VerificationCode.filter(expiration_at__lte=now)
+            if cursor is not None:
+                expiration_at, code_id = cursor
+                query = query.filter(
+                    Q(expiration_at__gt=expiration_at) | Q(expiration_at=expiration_at, id__gt=code_id),
+                )
+            rows = await query.order_by('expiration_at', 'id').limit(batch_size).values_list('expiration_at', 'id')
+            if not rows:
+                return deleted
+            # code renewed since it was selected has a new expiration and is kept
+            deleted += await VerificationCode.filter(
+                id__in=[code_id for _, code_id in rows],
+                expiration_at__lte=now,
+            ).delete()
+            if len(rows) < batch_size:
+                return deleted
+            cursor = rows[-1]
+            await asyncio.sleep(pause)
+
+
+class RedisVerificationCodeStore(VerificationCodeStore):
+    """Keeps verification codes in storage keys expiring together with the codes."""
+    KEY_PREFIX = 'verification-code-'
+
+    def __init__(self, storage) -> None:
+        self.storage = storage
+
+    @classmethod
+    def _key(cls, email: str) -> str:
+        return f'{cls.KEY_PREFIX}{email}'
+
+    async def create(self, email: str, code_expiration: timedelta) -> int:
+        code = random_with_n_digits(settings.VERIFICATION_CODE_LENGTH)
+        await self.storage.set(key=self._key(email), value=code, exp=int(code_expiration.total_seconds()))
+        return code
+
+    async def check(self, email: str, code: int) -> bool:
+        stored_code = await self.storage.get(key=self._key(email))
+        return stored_code is not None and int(stored_code) == code
+
+    async def redeem(self, email: str, code: int) -> bool:
+        return await self.storage.delete_if_equal(key=self._key(email), value=code)
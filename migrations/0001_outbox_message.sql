@@ -0,0 +1,13 @@
+-- transactional outbox of email tasks
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS "outbox_message" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "task" VARCHAR(255) NOT NULL,
+    "kwargs" JSONB NOT NULL DEFAULT '{}',
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+COMMENT ON TABLE "outbox_message" IS 'Task message written in the same transaction as the data it is about.';
+-- relay takes the oldest messages with ORDER BY id ... FOR UPDATE SKIP LOCKED, the primary key index serves it
+
+COMMIT;
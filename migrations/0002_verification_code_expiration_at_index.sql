@@ -0,0 +1,3 @@
+-- keyset scan of expired verification codes by purge_verification_codes
+-- CONCURRENTLY does not block code writes and cannot run in a transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_verificatio_expirat_1ff606" ON "verification_code" ("expiration_at");
@@ -0,0 +1,3 @@
+-- codes are unique per email only, the same code may be sent to several emails
+-- constraint name is the one postgres gives to "code" INT NOT NULL UNIQUE
+ALTER TABLE "verification_code" DROP CONSTRAINT IF EXISTS "verification_code_code_key";
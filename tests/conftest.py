@@ -0,0 +1,9 @@
+import os
+
+# settings without defaults, tests never connect to these services
+os.environ.setdefault('MAIL_USERNAME', 'test')
+os.environ.setdefault('MAIL_PASSWORD', 'test')
+os.environ.setdefault('MAIL_FROM', 'test@example.com')
+os.environ.setdefault('MAIL_PORT', '25')
+os.environ.setdefault('MAIL_SERVER', 'localhost')
+os.environ.setdefault('MAIL_FROM_NAME', 'test')
@@ -0,0 +1,120 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+from app.core.admission import AdmissionController
+from app.core.errors import AdmissionError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def hold(controller: AdmissionController, started: list, name: str, release: asyncio.Event) -> None:
+    async with controller.admit():
+        started.append(name)
+        await release.wait()
+
+
+def test_requests_run_up_to_limit_and_queue_in_order():
+    async def scenario():
+        controller = AdmissionController(limit=2, queue_size=3, queue_timeout=10)
+        started = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(controller, started, name, release)) for name in 'abcde']
+        await asyncio.sleep(0)
+        assert started == ['a', 'b']
+        assert (controller.in_flight, controller.queued) == (2, 3)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert started == ['a', 'b', 'c', 'd', 'e']
+        assert (controller.in_flight, controller.queued, controller.admitted) == (0, 0, 5)
+
+    run(scenario())
+
+
+def test_request_over_queue_size_is_rejected_at_once():
+    async def scenario():
+        controller = AdmissionController(limit=1, queue_size=1, queue_timeout=10)
+        started = []
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(controller, started, name, release)) for name in 'ab']
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionError) as exc_info:
+            await controller.acquire()
+        assert exc_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+        assert controller.rejected == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert started == ['a', 'b']
+        assert controller.in_flight == 0
+
+    run(scenario())
+
+
+def test_zero_queue_size_rejects_when_busy():
+    async def scenario():
+        controller = AdmissionController(limit=1, queue_size=0, queue_timeout=10)
+        await controller.acquire()
+        with pytest.raises(AdmissionError):
+            await controller.acquire()
+        controller.release()
+        await controller.acquire()
+        assert controller.in_flight == 1
+
+    run(scenario())
+
+
+def test_request_not_started_in_time_is_rejected():
+    async def scenario():
+        controller = AdmissionController(limit=1, queue_size=5, queue_timeout=0.01)
+        await controller.acquire()
+        with pytest.raises(AdmissionError):
+            await controller.acquire()
+        assert controller.timed_out == 1
+        assert controller.queued == 0
+
+        controller.release()
+        assert controller.in_flight == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_does_not_take_slot():
+    async def scenario():
+        controller = AdmissionController(limit=1, queue_size=5, queue_timeout=10)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        controller.release()
+        assert (controller.in_flight, controller.queued) == (0, 0)
+
+    run(scenario())
+
+
+def test_slot_handed_to_cancelled_waiter_is_not_lost():
+    async def scenario():
+        controller = AdmissionController(limit=1, queue_size=5, queue_timeout=10)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        # slot is handed over, the waiter is cancelled before it resumes
+        controller.release()
+        waiter.cancel()
+        try:
+            await waiter
+            admitted = True
+        except asyncio.CancelledError:
+            admitted = False
+        # waiter either got the slot or gave it back
+        assert (controller.in_flight, controller.queued) == (int(admitted), 0)
+
+    run(scenario())
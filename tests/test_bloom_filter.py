@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from app.core.bloom import BloomFilter
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    assert 'a' not in bloom
+    assert bloom.count == 0
+    assert bloom.estimated_error_rate == 0
+
+
+def test_size_follows_capacity_and_error_rate():
+    small = BloomFilter(capacity=1000, error_rate=0.01)
+    assert BloomFilter(capacity=10000, error_rate=0.01).size > small.size
+    assert BloomFilter(capacity=1000, error_rate=0.001).size > small.size
+    assert small.memory == (small.size + 7) // 8
+
+
+def test_zero_capacity_is_usable():
+    bloom = BloomFilter(capacity=0, error_rate=0.01)
+    bloom.add('a')
+    assert 'a' in bloom
+
+
+@pytest.mark.parametrize('capacity, error_rate', [(10, 0.1), (1000, 0.01), (5000, 0.001)])
+def test_added_values_are_never_missed(capacity, error_rate):
+    rnd = random.Random(capacity)
+    bloom = BloomFilter(capacity=capacity, error_rate=error_rate)
+    # twice the capacity, false negatives must not appear in an overfilled filter either
+    values = [f'{rnd.getrandbits(64):x}' for _ in range(capacity * 2)]
+    for value in values:
+        bloom.add(value)
+    assert all(value in bloom for value in values)
+    assert bloom.count == len(values)
+
+
+def test_false_positive_rate_is_near_error_rate():
+    rnd = random.Random(0)
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    added = {f'added-{rnd.getrandbits(64):x}' for _ in range(5000)}
+    for value in added:
+        bloom.add(value)
+    probes = [f'probe-{i}' for i in range(20000)]
+    false_positives = sum(probe in bloom for probe in probes)
+    assert false_positives / len(probes) < 0.02
+    assert bloom.estimated_error_rate == pytest.approx(0.01, rel=0.5)
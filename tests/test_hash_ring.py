@@ -0,0 +1,77 @@
+import pytest
+
+from app.core.hash_ring import HashRing
+
+
+KEYS = [f'user-refresh-tokens-{{{user_id}}}' for user_id in range(20000)]
+
+
+def assign(ring: HashRing) -> dict[str, str]:
+    return {key: ring.get_node(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_node():
+    with pytest.raises(LookupError):
+        HashRing().get_node('a')
+
+
+@pytest.mark.parametrize('key, tag', [
+    ('user-not-before-{42}', '42'),
+    ('{jobs}-delayed', 'jobs'),
+    ('a{b}{c}', 'b'),
+    ('no-tag', 'no-tag'),
+    ('open-{tag', 'open-{tag'),
+])
+def test_hash_tag(key, tag):
+    assert HashRing.hash_tag(key) == tag
+
+
+def test_keys_with_same_hash_tag_share_node():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    for user_id in range(100):
+        assert ring.get_node(f'user-refresh-tokens-{{{user_id}}}') == ring.get_node(f'user-not-before-{{{user_id}}}')
+
+
+def test_routing_does_not_depend_on_node_order():
+    assert assign(HashRing(['a', 'b', 'c'])) == assign(HashRing(['c', 'a', 'b']))
+
+
+def test_keys_are_spread_over_nodes():
+    nodes = ['a', 'b', 'c', 'd']
+    counts = dict.fromkeys(nodes, 0)
+    for node in assign(HashRing(nodes)).values():
+        counts[node] += 1
+    for count in counts.values():
+        assert abs(count - len(KEYS) / len(nodes)) < len(KEYS) / len(nodes) * 0.25
+
+
+def test_added_node_takes_keys_only_from_others():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    before = assign(ring)
+    ring.add_node('e')
+    after = assign(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'e' for key in moved)
+    # about 1/5 of keys move to the new node
+    assert abs(len(moved) / len(KEYS) - 1 / 5) < 0.05
+
+
+def test_removed_node_gives_away_only_its_keys():
+    ring = HashRing(['a', 'b', 'c', 'd', 'e'])
+    before = assign(ring)
+    ring.remove_node('e')
+    after = assign(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved == [key for key in KEYS if before[key] == 'e']
+
+
+def test_add_and_remove_are_idempotent():
+    ring = HashRing(['a', 'b'], vnodes=10)
+    before = assign(ring)
+    ring.add_node('a')
+    assert assign(ring) == before
+    ring.remove_node('c')
+    ring.remove_node('b')
+    ring.remove_node('b')
+    assert ring.nodes == {'a'}
+    assert {ring.get_node(key) for key in KEYS[:100]} == {'a'}
@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+
+from app.core import memory_storage
+from app.core.memory_storage import MemoryStorage
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(memory_storage, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def storage(clock) -> MemoryStorage:
+    return MemoryStorage()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_get_returns_bytes_like_redis(storage):
+    run(storage.set(key='a', value='x', exp=10))
+    run(storage.set(key='b', value=5, exp=10))
+    assert run(storage.get(key='a')) == b'x'
+    assert run(storage.get(key='b')) == b'5'
+    assert run(storage.get(key='missing')) is None
+    assert run(storage.get_many(keys=['a', 'missing', 'b'])) == [b'x', None, b'5']
+
+
+def test_key_expires(storage, clock):
+    run(storage.set(key='a', value='x', exp=10))
+    clock.sleep(9.9)
+    assert run(storage.get(key='a')) == b'x'
+    clock.sleep(0.1)
+    assert run(storage.get(key='a')) is None
+    assert storage.stats()['keys'] == 0
+
+
+def test_delete(storage):
+    run(storage.set(key='a', value='x', exp=10))
+    assert run(storage.delete(key='a')) == 1
+    assert run(storage.delete(key='a')) == 0
+    assert run(storage.get(key='a')) is None
+
+
+def test_set_default(storage):
+    assert run(storage.set_default(key='a', value='x')) == 'x'
+    assert run(storage.set_default(key='a', value='y')) == b'x'
+
+
+def test_increment_keeps_expiration(storage, clock):
+    assert run(storage.increment(key='a')) == 1
+    run(storage.set(key='b', value=1, exp=10))
+    assert run(storage.increment(key='b', amount=2)) == 3
+    clock.sleep(10)
+    assert run(storage.get(key='b')) is None
+
+
+def test_delete_if_equal(storage):
+    run(storage.set(key='a', value=123, exp=10))
+    assert not run(storage.delete_if_equal(key='a', value=124))
+    assert run(storage.delete_if_equal(key='a', value=123))
+    assert run(storage.get(key='a')) is None
+    assert not run(storage.delete_if_equal(key='a', value=123))
+
+
+def test_wrong_type(storage):
+    run(storage.set_add('s', 'x'))
+    with pytest.raises(TypeError):
+        run(storage.get(key='s'))
+
+
+def test_sets(storage):
+    assert run(storage.set_add('s', 'x')) == 1
+    assert run(storage.set_add('s', 'x')) == 0
+    run(storage.set_add('s', 'y'))
+    assert run(storage.read_set('s')) == {b'x', b'y'}
+    assert run(storage.value_in_set('s', 'x'))
+    assert run(storage.delete_set_value('s', 'x')) == 1
+    assert run(storage.delete_set_value('s', 'x')) == 0
+    run(storage.delete_set_value('s', 'y'))
+    # empty set is removed like in redis
+    assert storage.stats()['keys'] == 0
+    assert run(storage.read_set('s')) == set()
+
+
+def test_expiring_set(storage, clock):
+    now = clock.now
+    run(storage.expiring_set_add('e', 'a', expire_at=now + 10))
+    run(storage.expiring_set_add('e', 'b', expire_at=now + 20))
+    assert run(storage.value_in_expiring_set('e', 'a'))
+    clock.sleep(10)
+    assert not run(storage.value_in_expiring_set('e', 'a'))
+    assert run(storage.value_in_expiring_set('e', 'b'))
+    # set expires together with its newest value
+    clock.sleep(10)
+    assert run(storage.get_many(keys=['e'])) == [None]
+    assert storage.stats()['keys'] == 0
+
+
+def test_expiring_set_add_prunes_expired_values(storage, clock):
+    run(storage.expiring_set_add('e', 'a', expire_at=clock.now + 1))
+    clock.sleep(1)
+    run(storage.expiring_set_add('e', 'b', expire_at=clock.now + 10))
+    assert run(storage.delete_expiring_set_value('e', 'a')) == 0
+    assert run(storage.delete_expiring_set_value('e', 'b')) == 1
+
+
+def test_replace_expiring_set_value(storage, clock):
+    run(storage.expiring_set_add('e', 'a', expire_at=clock.now + 10))
+    assert run(storage.replace_expiring_set_value('e', 'a', 'b', expire_at=clock.now + 10))
+    # replayed value is not active anymore
+    assert not run(storage.replace_expiring_set_value('e', 'a', 'c', expire_at=clock.now + 10))
+    assert run(storage.value_in_expiring_set('e', 'b'))
+    clock.sleep(10)
+    assert not run(storage.replace_expiring_set_value('e', 'b', 'c', expire_at=clock.now + 10))
+
+
+def test_prune_expiring_sets_and_delete_keys(storage, clock):
+    run(storage.expiring_set_add('tokens-1', 'a', expire_at=clock.now + 1))
+    run(storage.expiring_set_add('tokens-1', 'b', expire_at=clock.now + 10))
+    run(storage.expiring_set_add('tokens-2', 'c', expire_at=clock.now + 1))
+    run(storage.expiring_set_add('tokens-2', 'd', expire_at=clock.now + 10))
+    run(storage.set_add('tokens-3', 'e'))
+    clock.sleep(1)
+    assert run(storage.prune_expiring_sets(match='tokens-*')) == 2
+    assert run(storage.delete_keys(match='tokens-*', key_type='set')) == 1
+    assert run(storage.delete_keys(match='tokens-*')) == 2
+    assert storage.stats()['keys'] == 0
+
+
+def test_take_tokens(storage, clock):
+    buckets = [('ip', 1.0, 2.0), ('email', 0.5, 1.0)]
+    taken, tokens = run(storage.take_tokens(buckets))
+    assert taken and tokens == [1.0, 0.0]
+    # no bucket is charged when one of them is empty
+    taken, tokens = run(storage.take_tokens(buckets))
+    assert not taken and tokens == [1.0, 0.0]
+    clock.sleep(2)
+    taken, tokens = run(storage.take_tokens(buckets))
+    assert taken and tokens == [1.0, 0.0]
+
+
+def test_stream_send_and_read_range(storage, clock):
+    first = run(storage.send('stream', fields={'f': 'a'}))
+    second = run(storage.send('stream', fields={'f': 'b'}))
+    assert first < second
+    assert run(storage.read_range('stream')) == [(first, {b'f': b'a'}), (second, {b'f': b'b'})]
+    assert run(storage.read_range('stream', min_id=b'(' + first)) == [(second, {b'f': b'b'})]
+    assert run(storage.read_range('stream', count=1)) == [(first, {b'f': b'a'})]
+    assert run(storage.read_range('missing')) == []
+
+
+def test_stream_is_trimmed_by_min_id(storage, clock):
+    run(storage.send('stream', fields={'f': 'a'}))
+    clock.sleep(1)
+    min_id = f'{int(clock.now * 1000)}-0'
+    last = run(storage.send('stream', fields={'f': 'b'}, min_id=min_id))
+    assert [message_id for message_id, _ in run(storage.read_range('stream'))] == [last]
+
+
+def test_stream_read_waits_for_messages(storage):
+    async def scenario():
+        reader = asyncio.create_task(storage.read('stream', block=1000))
+        await asyncio.sleep(0)
+        message_id = await storage.send('stream', fields={'f': 'a'})
+        return message_id, await reader
+
+    message_id, response = run(scenario())
+    assert response == [[b'stream', [(message_id, {b'f': b'a'})]]]
+    assert run(storage.read('stream', last_msg_id=message_id, block=1)) == []
+
+
+def test_batch_runs_commands_in_order(storage):
+    batch = storage.batch()
+    batch.set(key='a', value='x', exp=10).get(key='a').set_add('s', 'y').value_in_set('s', 'y').delete(key='a')
+    assert run(batch.execute()) == [True, b'x', 1, True, 1]
+    assert run(storage.get(key='a')) is None
+
+
+def test_batch_set_nx_keeps_existing_value(storage, clock):
+    run(storage.set(key='a', value='x', exp=10))
+    batch = storage.batch()
+    batch.set(key='a', value='y', exp=10, nx=True).set(key='b', value='y', exp=10, nx=True)
+    assert run(batch.execute()) == [None, True]
+    assert run(storage.get(key='a')) == b'x'
+    clock.sleep(10)
+    assert run(storage.batch().set(key='a', value='y', exp=10, nx=True).execute()) == [True]
+
+
+def test_memory_is_released(storage, clock):
+    run(storage.set(key='a', value='x' * 100, exp=10))
+    run(storage.set_add('s', 'y'))
+    run(storage.expiring_set_add('e', 'z', expire_at=clock.now + 5))
+    run(storage.send('stream', fields={'f': 'a'}))
+    assert storage.stats()['memory'] > 0
+    run(storage.delete(key='s'))
+    run(storage.delete(key='stream'))
+    clock.sleep(10)
+    stats = storage.stats()
+    assert stats['keys'] == 0
+    assert stats['expired'] == 2
+    assert stats['memory'] == 0
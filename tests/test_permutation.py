@@ -0,0 +1,29 @@
+import pytest
+
+from app.core.permutation import KeyedPermutation
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 10, 255, 256, 1000, 4097])
+def test_permutation_is_bijective(size):
+    permutation = KeyedPermutation(size=size, key=b'secret')
+    assert sorted(permutation[index] for index in range(size)) == list(range(size))
+
+
+def test_permutation_is_defined_by_key():
+    size = 1000
+    first = [KeyedPermutation(size=size, key=b'first')[index] for index in range(size)]
+    assert first == [KeyedPermutation(size=size, key=b'first')[index] for index in range(size)]
+    assert first != [KeyedPermutation(size=size, key=b'second')[index] for index in range(size)]
+
+
+def test_permutation_shuffles_consecutive_indexes():
+    permutation = KeyedPermutation(size=10 ** 6, key=b'secret')
+    values = [permutation[index] for index in range(100)]
+    assert values != sorted(values)
+    assert sum(abs(b - a) == 1 for a, b in zip(values, values[1:])) < 5
+
+
+@pytest.mark.parametrize('index', [-1, 10])
+def test_index_out_of_range(index):
+    with pytest.raises(IndexError):
+        KeyedPermutation(size=10, key=b'secret')[index]
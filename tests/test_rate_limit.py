@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.cache import memory as memory_cache
+from app.core import memory_storage, rate_limit
+from app.core.memory_storage import MemoryStorage
+from app.core.rate_limit import RateLimit, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def take_tokens(self, buckets, cost=1):
+        self.calls += 1
+        return await super().take_tokens(buckets, cost=cost)
+
+
+class BrokenStorage:
+    async def take_tokens(self, buckets, cost=1):
+        raise ConnectionError('storage is down')
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    for module in (memory_storage, rate_limit, memory_cache):
+        monkeypatch.setattr(module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def storage(clock) -> CountingStorage:
+    return CountingStorage()
+
+
+@pytest.fixture
+def limiter(storage) -> TokenBucketLimiter:
+    return TokenBucketLimiter(storage)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_parse_limit():
+    limit = RateLimit.parse('10/60')
+    assert limit == RateLimit(count=10, period=60.0)
+    assert limit.rate == pytest.approx(1 / 6)
+
+
+def test_requests_are_allowed_up_to_limit(limiter):
+    buckets = [('ip:1', RateLimit(count=3, period=3))]
+    assert [run(limiter.take(buckets)) for _ in range(3)] == [0, 0, 0]
+    assert run(limiter.take(buckets)) == pytest.approx(1.0)
+    assert limiter.rejects + limiter.local_rejects == 1
+
+
+def test_bucket_is_refilled_at_rate(limiter, clock):
+    buckets = [('ip:1', RateLimit(count=2, period=10))]
+    run(limiter.take(buckets))
+    run(limiter.take(buckets))
+    assert run(limiter.take(buckets)) == pytest.approx(5.0)
+    clock.sleep(2.5)
+    assert run(limiter.take(buckets)) == pytest.approx(2.5)
+    clock.sleep(2.5)
+    assert run(limiter.take(buckets)) == 0
+    clock.sleep(100)
+    # refilled up to capacity only
+    assert [run(limiter.take(buckets)) for _ in range(3)][2] > 0
+
+
+def test_empty_bucket_is_refused_locally(limiter, storage):
+    buckets = [('ip:1', RateLimit(count=1, period=10))]
+    run(limiter.take(buckets))
+    assert storage.calls == 1
+    assert run(limiter.take(buckets)) == pytest.approx(10.0)
+    assert storage.calls == 1
+    assert limiter.local_rejects == 1
+
+
+def test_bucket_emptied_by_other_process_is_refused_by_storage(limiter, storage):
+    buckets = [('ip:1', RateLimit(count=1, period=10))]
+    other = TokenBucketLimiter(storage)
+    run(other.take(buckets))
+    assert run(limiter.take(buckets)) == pytest.approx(10.0)
+    assert limiter.rejects == 1
+    # then by local state
+    assert run(limiter.take(buckets)) > 0
+    assert storage.calls == 2
+
+
+def test_tokens_are_taken_only_if_every_bucket_has_them(limiter, storage):
+    ip = ('ip:1', RateLimit(count=2, period=10))
+    email = ('email:a', RateLimit(count=1, period=10))
+    run(TokenBucketLimiter(storage).take([email]))
+    assert run(limiter.take([ip, email])) > 0
+    # refused request spent no ip token
+    assert run(limiter.take([ip, ('email:b', RateLimit(count=1, period=10))])) == 0
+    assert run(limiter.take([ip, ('email:c', RateLimit(count=1, period=10))])) == 0
+
+
+def test_request_without_buckets_is_allowed(limiter, storage):
+    assert run(limiter.take([])) == 0
+    assert storage.calls == 0
+
+
+def test_request_is_allowed_when_storage_fails(clock):
+    limiter = TokenBucketLimiter(BrokenStorage())
+    assert run(limiter.take([('ip:1', RateLimit(count=1, period=10))])) == 0
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from app.core.timing_wheel import TimingWheel
+
+
+def advance_by_ticks(wheel: TimingWheel, until: float, step: float) -> list[tuple[float, object]]:
+    """Advances wheel in steps, returns due keys with time they were reported at."""
+    due = []
+    now = wheel.tick * wheel.resolution
+    while now < until:
+        now = min(now + step, until)
+        due.extend((now, key) for key in wheel.advance(now))
+    return due
+
+
+def test_slots_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        TimingWheel(slots=60)
+
+
+def test_key_is_due_at_deadline():
+    wheel = TimingWheel(resolution=1.0, slots=8, levels=2)
+    assert wheel.schedule('a', 3.0)
+    assert wheel.advance(2.0) == []
+    assert wheel.advance(3.0) == ['a']
+    assert 'a' not in wheel
+    assert len(wheel) == 0
+
+
+def test_key_is_never_due_before_deadline():
+    wheel = TimingWheel(resolution=1.0, slots=8, levels=2)
+    wheel.schedule('a', 2.5)
+    assert wheel.advance(2.0) == []
+    assert wheel.advance(3.0) == ['a']
+
+
+def test_passed_deadline_is_not_scheduled():
+    wheel = TimingWheel(now=10.0)
+    assert not wheel.schedule('a', 10.0)
+    assert not wheel.schedule('b', 5.0)
+    assert len(wheel) == 0
+
+
+def test_schedule_replaces_deadline():
+    wheel = TimingWheel(slots=8, levels=2)
+    wheel.schedule('a', 2.0)
+    wheel.schedule('a', 5.0)
+    assert wheel.deadline('a') == 5.0
+    assert len(wheel) == 1
+    assert wheel.advance(4.0) == []
+    assert wheel.advance(5.0) == ['a']
+
+
+def test_cancel():
+    wheel = TimingWheel(slots=8, levels=2)
+    wheel.schedule('a', 2.0)
+    wheel.cancel('a')
+    wheel.cancel('missing')
+    assert wheel.deadline('a') is None
+    assert wheel.advance(10.0) == []
+
+
+def test_deadline_of_upper_level_is_cascaded():
+    wheel = TimingWheel(resolution=1.0, slots=4, levels=3)
+    wheel.schedule('a', 37.0)
+    due = advance_by_ticks(wheel, until=40.0, step=1.0)
+    assert due == [(37.0, 'a')]
+
+
+def test_deadline_beyond_span_waits_in_last_level():
+    wheel = TimingWheel(resolution=1.0, slots=4, levels=2)
+    wheel.schedule('a', 100.0)
+    due = advance_by_ticks(wheel, until=120.0, step=1.0)
+    assert due == [(100.0, 'a')]
+
+
+def test_advance_jumps_over_empty_ticks():
+    wheel = TimingWheel(resolution=1.0, slots=8, levels=2)
+    assert wheel.advance(1000.0) == []
+    assert wheel.tick == 1000
+    wheel.schedule('a', 1001.0)
+    assert wheel.advance(1001.0) == ['a']
+
+
+@pytest.mark.parametrize('step', [0.3, 1.0, 7.0, 50.0])
+def test_random_deadlines_are_due_once_and_in_time(step):
+    rnd = random.Random(step)
+    wheel = TimingWheel(resolution=0.5, slots=8, levels=3, now=0.0)
+    deadlines = {key: rnd.uniform(0.1, 400.0) for key in range(500)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    cancelled = set(rnd.sample(sorted(deadlines), 50))
+    for key in cancelled:
+        wheel.cancel(key)
+
+    due = advance_by_ticks(wheel, until=500.0, step=step)
+    reported = [key for _, key in due]
+    assert sorted(reported) == sorted(set(deadlines) - cancelled)
+    for now, key in due:
+        # reported at the first advance reaching the tick of deadline
+        assert deadlines[key] <= now < deadlines[key] + wheel.resolution + step
+    assert len(wheel) == 0